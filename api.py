@@ -0,0 +1,247 @@
+"""Embeds PlsExplain in python programs.
+
+    import api
+
+    program = api.compile('print("hello", name); len(name)', globals=["name"])
+    result = program.run(globals={"name": "world"})
+    if result.error is None:
+        print(result.output, api.to_python(result.value))
+
+A program is parsed once. It is resolved once for every set of global
+variable names it is run with. Every run gets a fresh global frame and
+doesn't see the variables of other runs, including assignments to builtins.
+Errors are returned as `Error`s instead of being printed.
+
+print and input use sys.stdout and sys.stdin, which `run` redirects, and
+the comment mode is global, so programs must not run in several threads at
+once."""
+
+import contextlib
+import io
+import sys
+import lark
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from engines import engines
+from parser import parser
+from jlast import ToAst, SourceLocation
+from environment import Environment
+from prelude import prelude
+from resolver import Resolver
+from optimizer import ConstantFolder, comment_mode_for
+from bytecode import BytecodeCompiler
+from exceptions import JlException, TailCalls, format_backtrace
+from jltypes import *
+
+
+@dataclass
+class Error:
+    # the name of the exception, like JlTypeError or SyntaxError
+    kind: str
+    message: str
+    # the locations of the calls that led to the error, the most recent last
+    backtrace: List[SourceLocation]
+    # the error as the command line interpreter prints it
+    text: str
+
+    @property
+    def location(self):
+        return self.backtrace[-1] if self.backtrace else None
+
+
+@dataclass
+class Result:
+    value: Value = None
+    # what the program printed, unless it was written to the stdout of run
+    output: str = None
+    globals: Dict[str, Value] = field(default_factory=dict)
+    error: Error = None
+    # the comment mode the program ran in, see comment_mode_for. with "none",
+    # values only have their default comment, not one that explains them
+    comments: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class CompileError(Exception):
+    def __init__(self, error):
+        super().__init__(error.text)
+        self.error = error
+
+
+def to_value(value):
+    # converts python values passed to programs
+    if isinstance(value, Value):
+        return value
+    if value is None:
+        return unit
+    if isinstance(value, bool):
+        return true if value else false
+    if isinstance(value, (int, float)):
+        return JlNumber(float(value))
+    if isinstance(value, str):
+        return JlString(value)
+    if isinstance(value, (list, tuple)):
+        return JlList([to_value(v) for v in value])
+    if isinstance(value, dict):
+        d = JlDict()
+        for k, v in value.items():
+            key = to_value(k)
+            if key.key() is None:
+                raise TypeError(f"{type(k).__name__} can not be a key of PlsExplain dicts")
+            d.value[key.key()] = (key, to_value(v))
+        return d
+    raise TypeError(f"{type(value).__name__} can not be passed to PlsExplain programs")
+
+
+def to_python(value):
+    # converts the values of programs, callables and comments stay as they are
+    if isinstance(value, JlUnit):
+        return None
+    if isinstance(value, JlBool):
+        return value.value
+    if isinstance(value, JlNumber):
+        number = value.value
+        if isinstance(number, float) and number.is_integer():
+            return int(number)
+        return number
+    if isinstance(value, JlString):
+        return value.value
+    if isinstance(value, JlList):
+        return [to_python(v) for v in value.value]
+    if isinstance(value, JlArray):
+        return list(value.value)
+    if isinstance(value, JlDict):
+        return {to_python(k): to_python(v) for k, v in value.value.values()}
+    return value
+
+
+def backtrace_error(kind, message, backtrace, source):
+    locations = [loc.location if isinstance(loc, TailCalls) else loc for loc in backtrace]
+    return Error(kind, message, locations, format_backtrace(backtrace, source) + '\n' + message)
+
+
+def syntax_error(e, filename, source):
+    if isinstance(e, lark.exceptions.UnexpectedToken):
+        message = f"syntax error: expected one of {e.expected}"
+    elif isinstance(e, lark.exceptions.UnexpectedCharacters):
+        message = "syntax error: unexpected characters"
+    else:
+        message = "syntax error: unexpected end of file"
+    location = SourceLocation(filename, e.line, e.column, e.line, e.column + 1)
+    text = f"{filename}:{e.line}:{e.column} {message}\n{e.get_context(source)}"
+    return Error("SyntaxError", message, [location], text)
+
+
+class Resolved:
+    """A program resolved for one set of global variable names."""
+
+    def __init__(self, ast, names, comments):
+        self.ast = ast
+        self.names = names
+        self.comments = comments
+        self.code = None
+
+
+class CompiledProgram:
+    def __init__(self, source, filename, parse_tree, engine, optimize, max_depth, comments):
+        self.source = source
+        self.filename = filename
+        self.parse_tree = parse_tree
+        self.engine = engine
+        self.optimize = optimize
+        self.max_depth = max_depth
+        self.comments = comments
+        # sorted global names -> Resolved
+        self.resolved = {}
+
+    def resolve(self, global_names):
+        key = tuple(sorted(global_names))
+        resolved = self.resolved.get(key)
+        if resolved is not None:
+            return resolved
+
+        env = Environment(prelude, names={})
+        for name in key:
+            env.define(name, unit)
+        # the resolver fills in the AST, so every set of names needs its own
+        ast = ToAst(self.filename).transform(self.parse_tree)
+        try:
+            Resolver(env).visit(ast)
+        except JlException as e:
+            raise CompileError(backtrace_error(type(e).__name__, str(e), e.backtrace, self.source))
+        if self.optimize:
+            ast = ConstantFolder().visit(ast)
+        resolved = self.resolved[key] = Resolved(ast, env.names,
+                                                 comment_mode_for(self.comments, ast))
+        return resolved
+
+    def run(self, globals=None, stdout=None, stdin=None):
+        """Runs the program with the given global variables, python values
+        are converted with to_value. Writes what the program prints to
+        stdout, if given, and reads its input from stdin."""
+        values = {name: to_value(v) for name, v in (globals or {}).items()}
+        resolved = self.resolve(values)
+
+        interpreter = engines[self.engine](self.max_depth)
+        env = interpreter.environment
+        env.set_names(resolved.names)
+        for name, value in values.items():
+            env.values[resolved.names[name]] = value
+
+        output = io.StringIO() if stdout is None else stdout
+        result = Result(comments=resolved.comments)
+        try:
+            with contextlib.redirect_stdout(output), redirect_stdin(stdin), \
+                 using_comment_mode(resolved.comments):
+                result.value = self.evaluate(interpreter, resolved)
+        except JlException as e:
+            result.error = backtrace_error(type(e).__name__, str(e), e.backtrace, self.source)
+        except RecursionError:
+            result.error = backtrace_error("RecursionError", "maximum recursion depth exceded",
+                                           interpreter.backtrace, self.source)
+        if stdout is None:
+            result.output = output.getvalue()
+        result.globals = env.bindings
+        return result
+
+    def evaluate(self, interpreter, resolved):
+        if self.engine == "vm":
+            # the bytecode doesn't depend on the interpreter, so it's reused
+            if resolved.code is None:
+                resolved.code = BytecodeCompiler().compile(resolved.ast)
+            return interpreter.run(resolved.code, interpreter.environment)
+        return interpreter.visit(resolved.ast)
+
+
+@contextlib.contextmanager
+def redirect_stdin(stdin):
+    if stdin is None:
+        yield
+        return
+    saved = sys.stdin
+    sys.stdin = stdin
+    try:
+        yield
+    finally:
+        sys.stdin = saved
+
+
+def compile(source, filename="<string>", globals=(), engine="tree", optimize=True, max_depth=None,
+            comments="full"):
+    """Parses and resolves a program. The names in globals are global
+    variables whose values are passed to `run`. comments is one of the
+    comment_modes, see pls_explain --comments. Raises CompileError if the
+    program has a syntax error or uses undefined variables."""
+    if comments not in comment_modes:
+        raise ValueError(f"unknown comment mode {comments!r}")
+    try:
+        parse_tree = parser.parse(source)
+    except lark.exceptions.UnexpectedInput as e:
+        raise CompileError(syntax_error(e, filename, source))
+    program = CompiledProgram(source, filename, parse_tree, engine, optimize, max_depth, comments)
+    program.resolve(globals)
+    return program
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+# changing any of these files can change the resolved AST of a program
+# (closure_compiler.py holds the operators the optimizer folds with)
+_interpreter_sources = ["parser.py", "jlast.py", "jltypes.py", "environment.py",
+                        "resolver.py", "optimizer.py", "closure_compiler.py", "prelude.py",
+                        "ast_cache.py"]
+
+
+def interpreter_version():
+    h = hashlib.sha256(sys.version.encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in _interpreter_sources:
+        with open(os.path.join(directory, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def default_cache_dir():
+    if "PLS_EXPLAIN_CACHE" in os.environ:
+        return os.environ["PLS_EXPLAIN_CACHE"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pls_explain")
+
+
+class AstCache:
+    """On-disk cache of resolved (and optimized) ASTs.
+
+    There is one entry per program file. It stores a hash of the source and
+    of the interpreter version next to the AST and the names of the global
+    variables the resolver assigned slots to. If either hash doesn't match
+    anymore, the entry is ignored and overwritten."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+        self.version = interpreter_version()
+
+    def _entry_path(self, filename, optimize):
+        name = f"{os.path.abspath(filename)}:{optimize}"
+        return os.path.join(self.directory, hashlib.sha256(name.encode()).hexdigest() + ".pickle")
+
+    def _key(self, source):
+        return hashlib.sha256((self.version + source).encode()).hexdigest()
+
+    def load(self, filename, source, optimize, environment):
+        try:
+            with open(self._entry_path(filename, optimize), 'rb') as f:
+                key, ast, names = pickle.load(f)
+        except Exception:
+            # missing, unreadable or corrupt entries are just cache misses
+            return None
+        if key != self._key(source):
+            return None
+        environment.set_names(dict(names))
+        return ast
+
+    def store(self, filename, source, optimize, ast, environment):
+        entry = (self._key(source), ast, environment.names)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            # other processes only ever see complete entries
+            os.replace(tmp, self._entry_path(filename, optimize))
+        except (OSError, pickle.PicklingError, RecursionError):
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
@@ -0,0 +1,94 @@
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import api
+
+
+def find_programs(directory):
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".pe"))
+    return paths
+
+
+def error_json(error):
+    location = error.location
+    return {
+        "kind": error.kind,
+        "message": error.message,
+        "line": location.line if location else None,
+        "column": location.column if location else None,
+        "text": error.text,
+    }
+
+
+def run_program(path, engine, optimize, max_depth, comments):
+    # runs in the worker processes. every program gets its own interpreter
+    # and reads an empty input
+    start = time.perf_counter()
+    entry = {"file": path}
+    # written by the program as it runs, so it is kept if the run fails
+    output = io.StringIO()
+    try:
+        with open(path) as f:
+            source = f.read()
+        program = api.compile(source, path, engine=engine, optimize=optimize, max_depth=max_depth,
+                              comments=comments)
+        result = program.run(stdout=output, stdin=io.StringIO())
+        if result.error is None:
+            entry["value"] = str(result.value)
+            # the default comment would look like an explanation
+            if result.comments != "none":
+                entry["comment"] = str(result.value.get_comment())
+        else:
+            entry["error"] = error_json(result.error)
+    except api.CompileError as e:
+        entry["error"] = error_json(e.error)
+    except Exception as e:
+        # bugs of the interpreter and unreadable files fail only this program
+        entry["error"] = {"kind": type(e).__name__, "message": str(e)}
+    entry["output"] = output.getvalue()
+    entry["ok"] = "error" not in entry
+    entry["time_s"] = time.perf_counter() - start
+    return entry
+
+
+def run_worker(args):
+    return run_program(*args)
+
+
+def run_batch(directory, jobs=None, engine="tree", optimize=True, max_depth=None, comments="full",
+              out=sys.stdout):
+    """Runs all .pe files in directory and writes one JSON line per program
+    to out, in the order they finish. Returns the number of programs that
+    failed."""
+    paths = find_programs(directory)
+    tasks = [(path, engine, optimize, max_depth, comments) for path in paths]
+    jobs = jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    failed = 0
+
+    def write(entry):
+        out.write(json.dumps(entry) + "\n")
+        out.flush()
+
+    if jobs == 1:
+        for entry in map(run_worker, tasks):
+            failed += not entry["ok"]
+            write(entry)
+    else:
+        # the workers are forked once with everything imported and get the
+        # programs one at a time, so long programs don't hold up the rest
+        with multiprocessing.Pool(jobs) as pool:
+            for entry in pool.imap_unordered(run_worker, tasks, chunksize=1):
+                failed += not entry["ok"]
+                write(entry)
+
+    print(f"{len(paths)} programs, {failed} failed, {time.perf_counter() - start:.2f}s",
+          file=sys.stderr)
+    return failed
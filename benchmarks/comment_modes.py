@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# Compares the comment modes (pls_explain.py --comments) on programs that
+# compute a lot without looking at the comments. Every program and mode is
+# measured by run.py in a fresh process; the evaluation time and the memory
+# allocated by it are shown next to the speedup over the full comments.
+#
+#   arith_loop    the comment of the sum explains every iteration
+#   build_string  concatenates long strings, whose default comments quote them
+#   closures      calls lots of small functions
+
+import json
+import os
+import subprocess
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+programs = ['arith_loop', 'build_string', 'closures']
+modes = ['full', 'summary', 'none']
+
+
+def measure(name, engine, mode):
+    proc = subprocess.run([sys.executable, os.path.join(here, 'run.py'), '--single', name,
+                           '--engine', engine, '--comments', mode],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"{name} ({engine}, {mode}): {proc.stderr.strip()}")
+    return json.loads(proc.stdout)
+
+
+if __name__ == '__main__':
+    engines = sys.argv[1:] or ['tree', 'vm']
+    for name in programs:
+        for engine in engines:
+            full = None
+            for mode in modes:
+                result = measure(name, engine, mode)
+                full = full or result
+                print(f"{name:<12} {engine:<8} {mode:<8} {result['eval_s']:7.3f}s "
+                      f"x{full['eval_s'] / result['eval_s']:<5.2f} "
+                      f"{result['eval_alloc_kb'] / 1024:8.1f} MB")
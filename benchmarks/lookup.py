@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Micro-benchmark of variable lookups: the old dict-chain environment that
+# recursed once per scope level against the slot-indexed frames.
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from environment import Environment
+from jlast import Name
+
+
+class DictEnvironment:
+    # the environment as it was before variables got slots
+    def __init__(self, parent=None):
+        self.bindings = {}
+        self.parent = parent
+
+    def put(self, name, value, depth=None):
+        if depth is None:
+            depth = name.binding_depth
+
+        if depth == 0:
+            self.bindings[name.name] = value
+        else:
+            self.parent.put(name, value, depth - 1)
+
+    def get(self, name, depth=None):
+        if depth is None:
+            depth = name.binding_depth
+
+        if depth == 0:
+            if name.name in self.bindings:
+                return self.bindings[name.name]
+            return None
+
+        return self.parent.get(name, depth - 1)
+
+
+def loop(env, i, total, n):
+    # the lookups and assignments done by `while (i < n) { total = total + i; i = i + 1 }`
+    for _ in range(n):
+        env.get(i)
+        env.put(total, env.get(total))
+        env.put(i, env.get(i))
+
+
+def make_dict_env(depth, names):
+    env = DictEnvironment()
+    for name in names:
+        env.bindings[name.name] = 0
+    for _ in range(depth):
+        env = DictEnvironment(env)
+    return env
+
+
+def make_frames(depth, names):
+    env = Environment(size=len(names))
+    for name in names:
+        env.values[name.slot] = 0
+    for _ in range(depth):
+        env = Environment(env, 4)
+    return env
+
+
+def main():
+    n = 100000
+    print(f"{'depth':>5} {'dict chain':>12} {'frames':>12} {'speedup':>8}")
+    for depth in (0, 1, 2, 4, 8):
+        names = [Name(None, "i", depth, 0), Name(None, "total", depth, 1)]
+        old = make_dict_env(depth, names)
+        new = make_frames(depth, names)
+        t_old = min(timeit.repeat(lambda: loop(old, *names, n), number=1, repeat=5))
+        t_new = min(timeit.repeat(lambda: loop(new, *names, n), number=1, repeat=5))
+        print(f"{depth:>5} {t_old * 1000:>10.1f}ms {t_new * 1000:>10.1f}ms {t_old / t_new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
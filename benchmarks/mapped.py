@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Reads random lines of a generated file, once through mmap_open and once
+# after reading all lines into a list, and prints the time and the peak
+# resident memory of both. The mapped file only keeps an index of the line
+# offsets in memory, the list all the lines.
+#
+#   benchmarks/mapped.py [megabytes] [engine]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+lookups = '''
+let n = len(table);
+let i = 0;
+let chars = 0;
+while (i < 20000) {
+    chars = chars + len(get(table, randint(0, n - 1)));
+    i = i + 1;
+};
+print("lines:", n, "characters:", chars);
+'''
+
+programs = {
+    "mmap_open": 'let table = mmap_open(path);' + lookups,
+    "list": '''
+let table = list();
+let it = lines(open(path));
+let line = next(it);
+while (!(line == ())) {
+    append(table, line);
+    line = next(it);
+};''' + lookups,
+}
+
+
+def write_table(path, megabytes):
+    with open(path, 'w') as f:
+        for i in range(megabytes * 2**20 // 40):
+            f.write(f"{i:08d} {'entry ' * 5}\n")
+
+
+def run(engine, source_path):
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(root, 'pls_explain.py'),
+                             f'--engine={engine}', '--no-cache', '--comments=summary', source_path],
+                            stdout=subprocess.PIPE)
+    output = proc.stdout.read().decode().strip()
+    _, status, usage = os.wait4(proc.pid, 0)
+    if status != 0:
+        sys.exit(f"{engine}: the program failed")
+    # ru_maxrss is in kilobytes on linux
+    return output, time.perf_counter() - start, usage.ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    engine = sys.argv[2] if len(sys.argv) > 2 else 'vm'
+    with tempfile.TemporaryDirectory() as tmp:
+        table = os.path.join(tmp, 'table.txt')
+        write_table(table, megabytes)
+        for name, program in programs.items():
+            source_path = os.path.join(tmp, f'{name}.pe')
+            with open(source_path, 'w') as f:
+                f.write(f'let path = "{table}";' + program)
+            output, seconds, rss = run(engine, source_path)
+            print(f"{megabytes}MB {name:<10} {seconds:7.2f}s {rss:8.1f} MB  {output}")
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# Peak resident memory of some programs, for every engine. Each run is a
+# fresh process, so the numbers include the interpreter itself (about 20MB).
+#
+#   build_list  builds a list of a million numbers
+#   captures    creates 200 closures in scopes with a list of 10000 numbers
+#               each. the closures only capture a number, so the lists
+#               must be freed with their scopes and the peak stays close to
+#               that of a single list
+
+import os
+import subprocess
+import sys
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+programs = ['build_list', 'captures']
+
+
+def peak_rss(engine, name):
+    program = os.path.join(root, 'benchmarks', 'programs', f'{name}.pe')
+    proc = subprocess.Popen([sys.executable, os.path.join(root, 'pls_explain.py'),
+                             f'--engine={engine}', '--no-cache', program],
+                            stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    if status != 0:
+        sys.exit(f"{name} ({engine}): the program failed")
+    # ru_maxrss is in kilobytes on linux
+    return usage.ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    engines = sys.argv[1:] or ['tree', 'closure', 'vm']
+    for name in programs:
+        for engine in engines:
+            print(f"{name:<12} {engine:<8} {peak_rss(engine, name):8.1f} MB")
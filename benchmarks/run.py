@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# Runs a set of PlsExplain programs and reports, for every program and
+# engine, the time spent parsing, resolving and evaluating it, the memory
+# allocated by each phase and the peak RSS, as JSON. Every program runs in a
+# fresh process, so the results don't depend on each other.
+#
+#   benchmarks/run.py --save-baseline baseline.json
+#   ... change the interpreter ...
+#   benchmarks/run.py --baseline baseline.json
+#
+# exits with status 1 if a result got worse than the baseline by more than
+# the threshold.
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+# name -> (path relative to the repository, input of the program)
+programs = {
+    "fact": ("examples/fact.pe", ""),
+    "fizzbuzz": ("examples/fizzbuzz.pe", ""),
+    "99bottles": ("examples/99bottles.pe", ""),
+    "tictactoe": ("examples/tictactoe.pe", "1\n2\n3\n4\n5\n6\n7\n8\n9\n"),
+    "arith_loop": ("benchmarks/programs/arith_loop.pe", ""),
+    "arrays": ("benchmarks/programs/arrays.pe", ""),
+    "recursion": ("benchmarks/programs/recursion.pe", ""),
+    "lists": ("benchmarks/programs/lists.pe", ""),
+    "bulk_lists": ("benchmarks/programs/bulk_lists.pe", ""),
+    "comments": ("benchmarks/programs/comments.pe", ""),
+    "build_string": ("benchmarks/programs/build_string.pe", ""),
+    "closures": ("benchmarks/programs/closures.pe", ""),
+    "captures": ("benchmarks/programs/captures.pe", ""),
+    "memo": ("benchmarks/programs/memo.pe", ""),
+    "dicts": ("benchmarks/programs/dicts.pe", ""),
+}
+
+phases = ["parse", "resolve", "eval"]
+
+# the results compared with the baseline, and the smallest change of each
+# that counts as a regression, so timer noise of tiny programs is ignored
+compared = {
+    "parse_s": 0.005,
+    "resolve_s": 0.005,
+    "eval_s": 0.005,
+    "total_s": 0.005,
+    "eval_alloc_kb": 64,
+    "max_rss_mb": 2,
+}
+
+
+def run_phases(path, source, stdin, engine, optimize, comments):
+    # yields the name of every phase right before running it
+    from pls_explain import engines, parse_source
+    from resolver import Resolver
+    from optimizer import ConstantFolder, comment_mode_for
+    from jltypes import set_comment_mode
+
+    # constants are folded with the whole comments, like pls_explain.py does
+    set_comment_mode("full")
+    interpreter = engines[engine]()
+    yield "parse"
+    ast = parse_source(path, source)
+    yield "resolve"
+    Resolver(interpreter.environment).visit(ast)
+    if optimize:
+        ast = ConstantFolder().visit(ast)
+    set_comment_mode(comment_mode_for(comments, ast))
+    yield "eval"
+    saved_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.visit(ast)
+    finally:
+        sys.stdin = saved_stdin
+
+
+def timed_phases(path, source, stdin, engine, optimize, comments):
+    times = {}
+    phase = None
+    for next_phase in itertools.chain(run_phases(path, source, stdin, engine, optimize, comments), [None]):
+        now = time.perf_counter()
+        if phase is not None:
+            times[phase] = now - start
+        phase, start = next_phase, now
+    return times
+
+
+def traced_phases(path, source, stdin, engine, optimize, comments):
+    # the most memory allocated at once during every phase
+    allocated = {}
+    phase = None
+    tracemalloc.start()
+    for next_phase in itertools.chain(run_phases(path, source, stdin, engine, optimize, comments), [None]):
+        current, peak = tracemalloc.get_traced_memory()
+        if phase is not None:
+            allocated[phase] = peak - start
+        phase, start = next_phase, current
+        tracemalloc.reset_peak()
+    tracemalloc.stop()
+    return allocated
+
+
+def measure(name, engine, repeat, optimize, comments):
+    path, stdin = programs[name]
+    with open(os.path.join(root, path)) as f:
+        source = f.read()
+
+    runs = [timed_phases(path, source, stdin, engine, optimize, comments) for _ in range(repeat)]
+    result = {f"{phase}_s": min(times[phase] for times in runs) for phase in phases}
+    result["total_s"] = min(sum(times.values()) for times in runs)
+    # ru_maxrss is in kilobytes on linux
+    result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    # tracing slows everything down and takes memory of its own, so the
+    # allocations are measured in a separate run after everything else
+    allocated = traced_phases(path, source, stdin, engine, optimize, comments)
+    for phase in phases:
+        result[f"{phase}_alloc_kb"] = allocated[phase] / 1024
+    return result
+
+
+def run_single(name, engine, repeat, optimize, comments):
+    # a program run in a process of its own, see run_all
+    from exceptions import JlException
+    try:
+        result = measure(name, engine, repeat, optimize, comments)
+    except (JlException, RecursionError) as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    print(json.dumps(result))
+
+
+def run_all(names, engines, repeat, optimize, comments):
+    results = {}
+    for name in names:
+        results[name] = {}
+        for engine in engines:
+            args = [sys.executable, os.path.abspath(__file__), "--single", name,
+                    "--engine", engine, "--repeat", str(repeat), "--comments", comments]
+            if not optimize:
+                args.append("--no-opt")
+            proc = subprocess.run(args, capture_output=True, text=True)
+            if proc.returncode != 0:
+                result = {"error": proc.stderr.strip().splitlines()[-1:]}
+            else:
+                result = json.loads(proc.stdout)
+            results[name][engine] = result
+            status = result.get("error") or f"{result['total_s']:.3f}s"
+            print(f"{name:<12} {engine:<8} {status}", file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "optimize": optimize,
+        "comments": comments,
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    regressions = []
+    for name, engines in report["results"].items():
+        for engine, result in engines.items():
+            old = baseline["results"].get(name, {}).get(engine)
+            if old is None or "error" in old or "error" in result:
+                continue
+            for key, noise in compared.items():
+                if key not in old or key not in result:
+                    continue
+                change = result[key] - old[key]
+                if change > noise and change > old[key] * threshold:
+                    regressions.append((name, engine, key, old[key], result[key]))
+    return regressions
+
+
+if __name__ == "__main__":
+    argp = argparse.ArgumentParser(description="Benchmark the PlsExplain interpreter")
+    argp.add_argument("programs", nargs="*",
+                      help=f"the programs to run, all of them by default ({', '.join(programs)})")
+    argp.add_argument("--engine", action="append", choices=["tree", "closure", "vm"],
+                      help="the engines to benchmark, all of them by default")
+    argp.add_argument("--repeat", type=int, default=3,
+                      help="run every program this many times and keep the fastest time")
+    argp.add_argument("--no-opt", dest="optimize", default=True, action="store_false",
+                      help="don't fold constant expressions")
+    argp.add_argument("--comments", default="full", choices=["full", "summary", "none"],
+                      help="the comment mode, see pls_explain.py --comments")
+    argp.add_argument("-o", "--output", help="write the JSON report to this file instead of stdout")
+    argp.add_argument("--baseline", help="compare the results with this report")
+    argp.add_argument("--save-baseline", help="also write the JSON report to this file")
+    argp.add_argument("--threshold", type=float, default=0.2,
+                      help="relative slowdown or growth that counts as a regression (default 0.2)")
+    argp.add_argument("--single", help=argparse.SUPPRESS)
+    args = argp.parse_args()
+    for name in args.programs:
+        if name not in programs:
+            argp.error(f"unknown program {name}")
+
+    if args.single is not None:
+        run_single(args.single, args.engine[0], args.repeat, args.optimize, args.comments)
+        sys.exit(0)
+
+    report = run_all(args.programs or list(programs), args.engine or ["tree", "closure", "vm"],
+                     args.repeat, args.optimize, args.comments)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, engine, key, old, new in regressions:
+            print(f"regression: {name} ({engine}) {key} {old:.3f} -> {new:.3f}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
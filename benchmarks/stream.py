@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Streams a generated log file through a program that counts its lines and
+# characters with lines and next, and prints the time and the peak resident
+# memory for every engine. The memory must not grow with the size of the
+# file. The comments are summarized, otherwise the comments of the counters
+# would explain every line that was counted.
+#
+#   benchmarks/stream.py [megabytes] [engines...]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+program = '''
+let it = lines(open(path));
+let count = 0;
+let chars = 0;
+let line = next(it);
+while (!(line == ())) {
+    count = count + 1;
+    chars = chars + len(line);
+    line = next(it);
+};
+print("lines:", count, "characters:", chars);
+'''
+
+
+def write_log(path, megabytes):
+    line = "2024-01-01 12:00:00 INFO request handled in 12ms by worker 7\n"
+    with open(path, 'w') as f:
+        for _ in range(megabytes * 2**20 // len(line)):
+            f.write(line)
+
+
+def run(engine, source_path):
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(root, 'pls_explain.py'),
+                             f'--engine={engine}', '--no-cache', '--comments=summary', source_path],
+                            stdout=subprocess.PIPE)
+    output = proc.stdout.read().decode().strip()
+    _, status, usage = os.wait4(proc.pid, 0)
+    if status != 0:
+        sys.exit(f"{engine}: the program failed")
+    # ru_maxrss is in kilobytes on linux
+    return output, time.perf_counter() - start, usage.ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    engines = sys.argv[2:] or ['tree', 'closure', 'vm']
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, 'log.txt')
+        write_log(log, megabytes)
+        source_path = os.path.join(tmp, 'stream.pe')
+        with open(source_path, 'w') as f:
+            f.write(f'let path = "{log}";' + program)
+        for engine in engines:
+            output, seconds, rss = run(engine, source_path)
+            print(f"{megabytes}MB {engine:<8} {seconds:7.2f}s {rss:8.1f} MB  {output}")
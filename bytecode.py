@@ -0,0 +1,219 @@
+from array import array
+import jlast
+from closure_compiler import binary_operators, unary_operators
+
+
+# every instruction is an opcode followed by a single argument
+CONST = 0          # push consts[arg]
+UNIT = 1           # push ()
+LOAD = 2           # push the variable names[arg]
+STORE = 3          # store the top of the stack in names[arg], without popping it
+POP = 4            # drop the top of the stack
+BINARY = 5         # apply binary_ops[arg] to the two topmost values
+UNARY = 6          # apply unary_ops[arg] to the topmost value
+JUMP = 7           # continue at instruction arg
+JUMP_IF_FALSE = 8  # pop the condition and jump to arg, if it is false
+CALL = 9           # call a function with arg arguments, closures are checked once per definition
+CLOSURE = 10       # create a closure of the function consts[arg]
+EXPLAIN = 11       # replace the topmost value with its comment
+COMMENT = 12       # explain the second value with the topmost value
+ENTER = 13         # begin a scope with arg variables
+LEAVE = 14         # end the innermost scope
+RETURN = 15        # return the topmost value
+LOAD_LOCAL = 16    # push the variable in slot arg of the innermost scope
+STORE_LOCAL = 17   # store the topmost value in slot arg of the innermost scope
+TAIL_CALL = 18     # like CALL, but replaces the frame of the caller
+LOAD_CELL = 19     # push the value of the cell of the variable names[arg]
+STORE_CELL = 20    # store the topmost value in the cell of names[arg], without popping it
+CELLS = 21         # create cells in the slots consts[arg] of the innermost scope
+
+opnames = ["CONST", "UNIT", "LOAD", "STORE", "POP", "BINARY", "UNARY", "JUMP",
+           "JUMP_IF_FALSE", "CALL", "CLOSURE", "EXPLAIN", "COMMENT", "ENTER",
+           "LEAVE", "RETURN", "LOAD_LOCAL", "STORE_LOCAL", "TAIL_CALL",
+           "LOAD_CELL", "STORE_CELL", "CELLS"]
+
+binary_ops = list(binary_operators)
+unary_ops = list(unary_operators)
+
+
+class Code:
+    """A compiled program or function body.
+
+    The instructions are stored in a flat array of opcodes and arguments.
+    The source location of each instruction is kept in a side table, so
+    errors can be reported with the same backtraces as the interpreter."""
+
+    def __init__(self):
+        self.code = array('i')
+        self.consts = []
+        self.names = []
+        self.locations = []
+        # the definition of the closure every instruction called last, see
+        # CallExpr.checked
+        self.checked = []
+        # the names accessed by LOAD_LOCAL, needed to report errors
+        self.local_names = {}
+
+    def emit(self, op, arg=0, location=None):
+        self.code.append(op)
+        self.code.append(arg)
+        self.locations.append(location)
+        self.checked.append(None)
+        return len(self.code) - 2
+
+    def patch(self, at, target):
+        self.code[at + 1] = target
+
+    def here(self):
+        return len(self.code)
+
+    def add_const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def add_name(self, name):
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def location(self, ip):
+        return self.locations[ip // 2]
+
+    def disassemble(self):
+        lines = []
+        for ip in range(0, len(self.code), 2):
+            op, arg = self.code[ip], self.code[ip + 1]
+            line = f"{ip:>5} {opnames[op]:<14} {arg}"
+            if op in (CONST, CELLS):
+                line += f" ({self.consts[arg]!r})"
+            elif op in (LOAD, STORE, LOAD_CELL, STORE_CELL):
+                line += f" ({self.names[arg].name})"
+            elif op in (LOAD_LOCAL, STORE_LOCAL):
+                line += f" ({self.local_names[ip].name})"
+            elif op == BINARY:
+                line += f" ({binary_ops[arg]})"
+            elif op == UNARY:
+                line += f" ({unary_ops[arg]})"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+class Function:
+    """The constant a CLOSURE instruction turns into a JlClosure."""
+    __slots__ = ("code", "params", "frame_size", "definition")
+
+    def __init__(self, code, params, frame_size, definition):
+        self.code = code
+        self.params = params
+        self.frame_size = frame_size
+        self.definition = definition
+
+    def __repr__(self):
+        return f"Function({[p.name for p in self.params]})"
+
+
+class BytecodeCompiler(jlast.AstVisitor):
+    def __init__(self):
+        super().__init__()
+        self.code = Code()
+
+    def compile(self, ast):
+        self.visit(ast)
+        self.code.emit(RETURN)
+        return self.code
+
+    def emit(self, op, arg=0, location=None):
+        return self.code.emit(op, arg, location)
+
+    def sequence(self, exprs):
+        if len(exprs) == 0:
+            self.emit(UNIT)
+        for i, e in enumerate(exprs):
+            if i > 0:
+                self.emit(POP)
+            self.visit(e)
+
+    def visit_program(self, b):
+        self.sequence(b.exprs)
+
+    def visit_block(self, b):
+        self.emit(ENTER, b.frame_size)
+        if b.cell_slots:
+            self.emit(CELLS, self.code.add_const(tuple(b.cell_slots)))
+        self.sequence(b.exprs)
+        self.emit(LEAVE)
+
+    def visit_commented_expr(self, e):
+        self.visit(e.expr)
+        self.visit(e.comment)
+        self.emit(COMMENT, 0, e.location)
+
+    def visit_assignment(self, a):
+        self.visit(a.expr)
+        if a.name.cell:
+            self.emit(STORE_CELL, self.code.add_name(a.name), a.location)
+        elif a.name.binding_depth == 0:
+            ip = self.emit(STORE_LOCAL, a.name.slot, a.location)
+            self.code.local_names[ip] = a.name
+        else:
+            self.emit(STORE, self.code.add_name(a.name), a.location)
+
+    def visit_declaration(self, d):
+        self.visit_assignment(d)
+
+    def visit_literal(self, l):
+        self.emit(CONST, self.code.add_const(l.value))
+
+    def visit_name(self, n):
+        if n.cell:
+            self.emit(LOAD_CELL, self.code.add_name(n), n.location)
+        elif n.binding_depth == 0:
+            ip = self.emit(LOAD_LOCAL, n.slot, n.location)
+            self.code.local_names[ip] = n
+        else:
+            self.emit(LOAD, self.code.add_name(n), n.location)
+
+    def visit_bin_expr(self, e):
+        self.visit(e.lhs)
+        self.visit(e.rhs)
+        self.emit(BINARY, binary_ops.index(e.op), e.location)
+
+    def visit_unary_expr(self, e):
+        self.visit(e.expr)
+        self.emit(UNARY, unary_ops.index(e.op), e.location)
+
+    def visit_call(self, c):
+        self.visit(c.f)
+        for a in c.args:
+            self.visit(a)
+        self.emit(TAIL_CALL if c.tail else CALL, len(c.args), c.location)
+
+    def visit_fn_expr(self, f):
+        body = BytecodeCompiler().compile(f.body)
+        function = Function(body, f.params, f.frame_size, f)
+        self.emit(CLOSURE, self.code.add_const(function), f.location)
+
+    def visit_explain_expr(self, c):
+        self.visit(c.expr)
+        self.emit(EXPLAIN)
+
+    def visit_while_expr(self, e):
+        self.emit(UNIT)
+        start = self.code.here()
+        self.visit(e.cond)
+        exit_jump = self.emit(JUMP_IF_FALSE)
+        self.emit(POP)
+        self.visit(e.body)
+        self.emit(JUMP, start)
+        self.code.patch(exit_jump, self.code.here())
+
+    def visit_if_expr(self, e):
+        self.visit(e.cond)
+        else_jump = self.emit(JUMP_IF_FALSE)
+        self.visit(e.then_body)
+        end_jump = self.emit(JUMP)
+        self.code.patch(else_jump, self.code.here())
+        if e.else_body is not None:
+            self.visit(e.else_body)
+        else:
+            self.emit(UNIT)
+        self.code.patch(end_jump, self.code.here())
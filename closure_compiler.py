@@ -0,0 +1,257 @@
+import operator
+import jlast
+from jltypes import *
+from environment import Environment
+from interpreter import Interpreter, TailCall
+from exceptions import *
+
+
+binary_operators = {
+    '&': operator.and_,
+    '|': operator.or_,
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '%': operator.mod,
+    '==': operator.eq,
+    '<': operator.lt,
+    '>': operator.gt,
+}
+
+unary_operators = {
+    '!': lambda v: v.not_(),
+    '-': operator.neg,
+}
+
+
+class ClosureCompiler(jlast.AstVisitor):
+    """Turns a resolved AST into nested python closures.
+
+    Every node is compiled once into a function taking the current
+    Environment, with the operator and the binding depth and slot baked in,
+    so evaluating it doesn't need any double dispatch or string compares."""
+
+    def __init__(self, interpreter):
+        super().__init__()
+        self.interpreter = interpreter
+
+    def visit_program(self, b):
+        exprs = [self.visit(e) for e in b.exprs]
+
+        def run(env):
+            value = unit
+            for e in exprs:
+                value = e(env)
+            return value
+        return run
+
+    def visit_block(self, b):
+        exprs = [self.visit(e) for e in b.exprs]
+        frame_size = b.frame_size
+        cell_slots = b.cell_slots
+
+        def run(env):
+            env = Environment(env, frame_size, cell_slots=cell_slots)
+            value = unit
+            for e in exprs:
+                value = e(env)
+            return value
+        return run
+
+    def visit_commented_expr(self, e):
+        expr = self.visit(e.expr)
+        comment_expr = self.visit(e.comment)
+        interp = self.interpreter
+        location = e.location
+
+        def run(env):
+            value = expr(env)
+            comment = comment_expr(env)
+            if not isinstance(comment, JlComment):
+                raise JlTypeError(f"type {type(comment).__name__} can not be used to explain values",
+                                  interp.backtrace, location)
+            return value.with_comment(comment)
+        return run
+
+    def visit_assignment(self, a):
+        expr = self.visit(a.expr)
+        depth = a.name.binding_depth
+        slot = a.name.slot
+
+        if a.name.cell:
+            def run(env):
+                value = expr(env)
+                for _ in range(depth):
+                    env = env.parent
+                env.values[slot].value = value
+                return value
+        elif depth == 0:
+            def run(env):
+                value = expr(env)
+                env.values[slot] = value
+                return value
+        else:
+            def run(env):
+                value = expr(env)
+                for _ in range(depth):
+                    env = env.parent
+                env.values[slot] = value
+                return value
+        return run
+
+    def visit_declaration(self, d):
+        return self.visit_assignment(d)
+
+    def visit_literal(self, l):
+        value = l.value
+        return lambda env: value
+
+    def visit_name(self, n):
+        interp = self.interpreter
+        depth = n.binding_depth
+        slot = n.slot
+
+        if n.cell:
+            def run(env):
+                for _ in range(depth):
+                    env = env.parent
+                value = env.values[slot].value
+                if value is None:
+                    raise UninizializedVariable(interp.backtrace, n)
+                return value
+        elif depth == 0:
+            def run(env):
+                value = env.values[slot]
+                if value is None:
+                    raise UninizializedVariable(interp.backtrace, n)
+                return value
+        else:
+            def run(env):
+                for _ in range(depth):
+                    env = env.parent
+                value = env.values[slot]
+                if value is None:
+                    raise UninizializedVariable(interp.backtrace, n)
+                return value
+        return run
+
+    def visit_bin_expr(self, e):
+        lhs_expr = self.visit(e.lhs)
+        rhs_expr = self.visit(e.rhs)
+        op = binary_operators[e.op]
+        interp = self.interpreter
+
+        def run(env):
+            lhs = lhs_expr(env)
+            rhs = rhs_expr(env)
+            try:
+                return op(lhs, rhs)
+            except TypeError:
+                raise JlTypeError(f"`{e.op}` not possible for types {type(lhs).__name__} and {type(rhs).__name__}",
+                                  interp.backtrace, e.location)
+        return run
+
+    def visit_unary_expr(self, e):
+        expr = self.visit(e.expr)
+        op = unary_operators[e.op]
+        interp = self.interpreter
+
+        def run(env):
+            value = expr(env)
+            try:
+                return op(value)
+            except TypeError:
+                raise JlTypeError(f"`{e.op}` not possible for type {type(value).__name__}",
+                                  interp.backtrace, e.location)
+        return run
+
+    def visit_call(self, c):
+        f_expr = self.visit(c.f)
+        arg_exprs = [self.visit(a) for a in c.args]
+        interp = self.interpreter
+        location = c.location
+        tail = c.tail
+        arity = len(arg_exprs)
+        # the definition of the closure called last, see CallExpr.checked
+        checked = None
+
+        def run(env):
+            nonlocal checked
+            f = f_expr(env)
+            args = [a(env) for a in arg_exprs]
+            if type(f) is JlClosure:
+                if f.definition is not checked:
+                    interp.check_callee(f, args, location)
+                    checked = f.definition
+                if tail:
+                    return TailCall(f, args, location)
+                return interp.call(f, args, location)
+            if type(f) is not JlPrimitive or f.arity is not None and f.arity != arity:
+                interp.check_callee(f, args, location)
+            if not f.calls_functions and interp.profiler is None:
+                try:
+                    r = f.callback(*args)
+                except JlException as e:
+                    if len(e.backtrace) == 0:
+                        e.backtrace = interp.backtrace + [location]
+                    raise e
+                return unit if r is None else r
+            return interp.call(f, args, location)
+        return run
+
+    def visit_fn_expr(self, f):
+        body = self.visit(f.body)
+        params = f.params
+        frame_size = f.frame_size
+        global_depth = f.global_depth
+        captures = f.captures
+        return lambda env: JlClosure(env.ancestor(global_depth), params, body, frame_size,
+                                     definition=f, cells=env.capture(captures))
+
+    def visit_explain_expr(self, c):
+        expr = self.visit(c.expr)
+        return lambda env: expr(env).get_comment()
+
+    def visit_while_expr(self, e):
+        cond = self.visit(e.cond)
+        body = self.visit(e.body)
+
+        def run(env):
+            value = unit
+            while cond(env).value:
+                value = body(env)
+            return value
+        return run
+
+    def visit_if_expr(self, e):
+        cond = self.visit(e.cond)
+        then_body = self.visit(e.then_body)
+        if e.else_body is None:
+            def run(env):
+                if cond(env).value:
+                    return then_body(env)
+                return unit
+        else:
+            else_body = self.visit(e.else_body)
+
+            def run(env):
+                if cond(env).value:
+                    return then_body(env)
+                return else_body(env)
+        return run
+
+
+class ClosureInterpreter(Interpreter):
+    """Interpreter that compiles the AST to closures before running it.
+
+    The bodies of the JlClosures created by this interpreter are compiled
+    functions instead of AST nodes."""
+
+    python_frames_per_call = 15
+
+    def visit(self, ast):
+        return ClosureCompiler(self).visit(ast)(self.environment)
+
+    def eval_with_env(self, body, env):
+        return body(env)
@@ -0,0 +1,10 @@
+from interpreter import Interpreter
+from closure_compiler import ClosureInterpreter
+from vm import VirtualMachine
+
+
+engines = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VirtualMachine,
+}
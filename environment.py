@@ -1,26 +1,103 @@
-    
+class Cell:
+    """A variable that closures capture.
+
+    The frame that declares the variable and the frames of the closures
+    that use it share the cell, so assignments are seen by all of them,
+    while the rest of the declaring frame can be freed."""
+    __slots__ = ("value",)
+
+    def __init__(self, value=None):
+        self.value = value
+
+
 class Environment:
-    def __init__(self, parent=None):
-        self.bindings = {}
+    """A frame of variables.
+
+    The resolver assigns every variable a slot in the frame of the scope that
+    declares it, so a variable is found by walking `binding_depth` parents and
+    indexing `values` with `slot`. Only the global frames keep a map from names
+    to slots, which the resolver needs to add definitions incrementally.
+
+    The parent of the frame of a function call is the global frame. The
+    variables the function uses from enclosing scopes are Cells, which the
+    closure copies into the last slots of the frame. Names with `cell` set refer to
+    the value of the Cell in their slot."""
+    __slots__ = ("values", "parent", "names")
+
+    def __init__(self, parent=None, size=0, names=None, cell_slots=()):
+        self.values = [None] * size
         self.parent = parent
-        
+        self.names = names
+        for slot in cell_slots:
+            self.values[slot] = Cell()
+
+    @classmethod
+    def with_bindings(cls, bindings, parent=None):
+        env = cls(parent, names={})
+        for name, value in bindings.items():
+            env.define(name, value)
+        return env
+
+    @property
+    def bindings(self):
+        if self.names is None:
+            return {}
+        return {name: self.values[slot] for name, slot in self.names.items()}
+
+    def define(self, name, value):
+        slot = self.names.setdefault(name, len(self.names))
+        self.set_names(self.names)
+        self.values[slot] = value
+
+    def set_names(self, names):
+        self.names = names
+        if len(self.values) < len(names):
+            self.values.extend([None] * (len(names) - len(self.values)))
+
+    def copy(self):
+        # a frame with the same names, whose variables are assigned separately
+        env = Environment(self.parent, names=self.names)
+        env.values = list(self.values)
+        return env
+
     def put(self, name, value, depth=None):
         if depth is None:
             depth = name.binding_depth
-            
-        if depth == 0:
-            self.bindings[name.name] = value
+        env = self
+        while depth:
+            env = env.parent
+            depth -= 1
+        if name.cell:
+            env.values[name.slot].value = value
         else:
-            self.parent.put(name, value, depth - 1)
+            env.values[name.slot] = value
 
     def get(self, name, depth=None):
         if depth is None:
             depth = name.binding_depth
+        env = self
+        while depth:
+            env = env.parent
+            depth -= 1
+        if name.cell:
+            return env.values[name.slot].value
+        return env.values[name.slot]
 
-        if depth == 0:
-            if name.name in self.bindings:
-                return self.bindings[name.name]
-            return None
-
-        return self.parent.get(name, depth - 1)
+    def ancestor(self, depth):
+        env = self
+        while depth:
+            env = env.parent
+            depth -= 1
+        return env
 
+    def capture(self, names):
+        # the cells of the variables a closure captures
+        cells = []
+        for name in names:
+            env = self
+            depth = name.binding_depth
+            while depth:
+                env = env.parent
+                depth -= 1
+            cells.append(env.values[name.slot])
+        return cells
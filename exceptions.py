@@ -1,13 +1,47 @@
+class SourceLines:
+    """The lines of a source, indexed by their line number.
+
+    The REPL appends every input to the same store, so the locations in
+    earlier inputs can still be shown. If `max_lines` is given, only that
+    many of the most recent lines are kept."""
+
+    def __init__(self, text=None, max_lines=None):
+        self.lines = []
+        # the number of the line in lines[0]
+        self.first = 1
+        self.max_lines = max_lines
+        if text is not None:
+            self.append(text)
+
+    def append(self, text):
+        # returns the number of the first line of text
+        start = self.first + len(self.lines)
+        self.lines.extend(text.split('\n'))
+        if self.max_lines is not None and len(self.lines) > self.max_lines:
+            dropped = len(self.lines) - self.max_lines
+            del self.lines[:dropped]
+            self.first += dropped
+        return start
+
+    def line(self, number):
+        index = number - self.first
+        if 0 <= index < len(self.lines):
+            return self.lines[index]
+        return None
+
+
 def get_context(location, text):
-    lines = text.split('\n')
+    if isinstance(text, str):
+        text = SourceLines(text)
+    first_line = text.line(location.line)
+    last_line = text.line(location.end_line)
+    if first_line is None or last_line is None:
+        return "[source no longer available]"
     if location.line == location.end_line:
-        line = lines[location.line - 1]
         marker = ' ' * (location.column - 1) + '^' + \
             '~' * (location.end_column - location.column - 1)
-        return line + '\n' + marker
+        return first_line + '\n' + marker
     else:
-        first_line = lines[location.line - 1]
-        last_line = lines[location.end_line - 1]
         marker = ' ' * (location.column - 1) + '^' + \
             '~' * (len(first_line) - location.column)
         end_marker = '~' * (location.end_column - 1)
@@ -18,11 +52,64 @@ def get_context(location, text):
         return msg
 
 
+class TailCalls:
+    """The tail calls a frame made, in a backtrace.
+
+    Consecutive calls from the same call site are counted, and only the
+    call sites of the last few are kept, so a long chain of tail calls
+    takes constant space, even if it alternates between functions."""
+
+    # the number of [location, count] runs that are kept
+    max_runs = 3
+
+    def __init__(self, location):
+        self.runs = [[location, 1]]
+        # the number of calls whose runs were dropped
+        self.dropped = 0
+
+    @property
+    def location(self):
+        return self.runs[-1][0]
+
+    def add(self, location):
+        runs = self.runs
+        if runs[-1][0] is location:
+            runs[-1][1] += 1
+        else:
+            if len(runs) == self.max_runs:
+                self.dropped += runs.pop(0)[1]
+            runs.append([location, 1])
+
+
 def format_backtrace(backtrace, text):
-    bt = "Backtrace (most recent call last):\n\n"
+    # text is the source as a string or SourceLines
+    if isinstance(text, str):
+        text = SourceLines(text)
+    # consecutive calls from the same location are only shown up to three times
+    entries = []
     for loc in backtrace:
-        bt += f"{loc.filename}:{loc.line}:{loc.column}\n"
-        bt += get_context(loc, text) + '\n'
+        runs = [(loc, 1)]
+        if isinstance(loc, TailCalls):
+            runs = loc.runs
+            if loc.dropped:
+                # None stands for the calls that were dropped
+                entries.append([None, loc.dropped])
+        for loc, count in runs:
+            if entries and entries[-1][0] is loc:
+                entries[-1][1] += count
+            else:
+                entries.append([loc, count])
+
+    bt = "Backtrace (most recent call last):\n\n"
+    for loc, count in entries:
+        if loc is None:
+            bt += f"[{count} earlier tail calls not shown]\n"
+            continue
+        for _ in range(min(count, 3)):
+            bt += f"{loc.filename}:{loc.line}:{loc.column}\n"
+            bt += get_context(loc, text) + '\n'
+        if count > 3:
+            bt += f"[call repeated {count - 3} more times]\n"
     return bt
 
 
@@ -61,3 +148,20 @@ class JlTypeError(JlException):
 
     def __str__(self):
         return f"type error: {self.msg}"
+
+
+class JlIOError(JlException):
+    def __init__(self, msg, bt=None, expr=None):
+        super().__init__(bt, expr)
+        self.msg = msg
+
+    def __str__(self):
+        return f"io error: {self.msg}"
+
+
+class RecursionDepthExceeded(JlException):
+    def __init__(self, bt, location):
+        super().__init__(bt, location)
+
+    def __str__(self):
+        return "maximum recursion depth exceded"
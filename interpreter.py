@@ -1,15 +1,44 @@
+import sys
 import jlast
 from jltypes import *
-from copy import copy
 from environment import Environment
 from prelude import prelude
 from exceptions import *
     
+class TailCall:
+    """Returned instead of calling a closure from a tail position.
+
+    The caller keeps calling the returned closures in a loop, so a chain of
+    tail calls doesn't grow the python stack."""
+    __slots__ = ("f", "args", "location")
+
+    def __init__(self, f, args, location):
+        self.f = f
+        self.args = args
+        self.location = location
+
+
 class Interpreter(jlast.AstVisitor):
-    def __init__(self):
+    # calls are evaluated on the python stack, so python's recursion limit is
+    # raised to fit max_depth calls of python_frames_per_call frames, but not
+    # above max_python_frames: builtins like memo recurse on the C stack too,
+    # which would overflow. running out of python frames, for example in
+    # deeply nested expressions, is reported like exceeding max_depth
+    default_max_depth = 1000
+    python_frames_per_call = 30
+    max_python_frames = 50000
+
+    def __init__(self, max_depth=None):
         super().__init__()
-        self.environment = Environment(prelude)
+        # programs can assign to builtins, so every interpreter has its own
+        self.environment = self.global_environment = Environment(prelude.copy(), names={})
         self.backtrace = []
+        self.max_depth = max_depth or self.default_max_depth
+        self.depth = 0
+        self.profiler = None
+        limit = min(self.max_depth * self.python_frames_per_call + 1000, self.max_python_frames)
+        if sys.getrecursionlimit() < limit:
+            sys.setrecursionlimit(limit)
 
     def eval_with_env(self, expr, env):
         saved_env = self.environment
@@ -18,18 +47,101 @@ class Interpreter(jlast.AstVisitor):
         self.environment = saved_env
         return value
 
-    def clear_backtrace(self):
+    def reset(self):
+        # an error can leave the interpreter in the frame of a function
+        self.environment = self.global_environment
         self.backtrace = []
+        self.depth = 0
+
+    def push_tail_call(self, location):
+        # the frame making the call is on top of the backtrace, and all its
+        # tail calls share an entry
+        last = self.backtrace[-1] if self.backtrace else None
+        if type(last) is TailCalls:
+            last.add(location)
+        else:
+            self.backtrace.append(TailCalls(location))
+
+    def check_callee(self, f, args, location):
+        if not isinstance(f, JlCallable):
+            raise JlTypeError(f"{type(f).__name__} is not callable",
+                              self.backtrace, location)
+        arity = f.get_arity()
+        if arity is not None and len(args) != arity:
+            raise JlTypeError(f"wrong number of arguments",
+                              self.backtrace, location)
+
+    def call_primitive(self, f, args, location):
+        # for primitives that don't call back into the interpreter. they
+        # can't recurse, and the call site is only needed on the backtrace
+        # if they fail
+        try:
+            r = f.callback(*args)
+        except JlException as e:
+            if len(e.backtrace) == 0:
+                e.backtrace = self.backtrace + [location]
+            raise e
+        return unit if r is None else r
+
+    def call_back(self, calls):
+        # runs the generator of a primitive that calls functions, see
+        # JlPrimitive. the functions are called from the call site of the
+        # primitive, which is on top of the backtrace, so it isn't shown twice
+        value = None
+        while True:
+            try:
+                f, args = calls.send(value)
+            except StopIteration as e:
+                return e.value
+            self.check_callee(f, args, None)
+            location = self.backtrace.pop()
+            value = self.call(f, args, location)
+            self.backtrace.append(location)
+
+    def call(self, f, args, location):
+        if self.depth >= self.max_depth:
+            raise RecursionDepthExceeded(self.backtrace, location)
+        self.depth += 1
+        depth = len(self.backtrace)
+        self.backtrace.append(location)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter(f, location)
+        try:
+            r = f.call(self, args)
+            while type(r) is TailCall:
+                self.push_tail_call(r.location)
+                if profiler is not None:
+                    profiler.leave()
+                    profiler.enter(r.f, r.location)
+                r = r.f.call(self, r.args)
+        except JlException as e:
+            if len(e.backtrace) == 0:
+                e.backtrace = self.backtrace
+            raise e
+        except RecursionError:
+            del self.backtrace[depth:]
+            raise RecursionDepthExceeded(self.backtrace, location)
+
+        del self.backtrace[depth:]
+        self.depth -= 1
+        if profiler is not None:
+            profiler.leave()
+        if r is None:
+            return unit
+        else:
+            return r
         
     def visit_program(self, b):
+        value = unit
         for stmt in b.exprs:
            value = self.visit(stmt)
         return value
     
     def visit_block(self, b):
         saved_env = self.environment
-        self.environment = Environment(saved_env)
-        value = JlUnit();
+        self.environment = Environment(saved_env, b.frame_size, cell_slots=b.cell_slots)
+        value = unit;
         for stmt in b.exprs:
            value = self.visit(stmt)
         self.environment = saved_env
@@ -41,9 +153,7 @@ class Interpreter(jlast.AstVisitor):
         if not isinstance(comment, JlComment):
             raise JlTypeError(f"type {type(comment).__name__} can not be used to explain values",
                               self.backtrace, e.location)
-        value = copy(value)
-        value.set_comment(comment)
-        return value
+        return value.with_comment(comment)
 
     def visit_assignment(self, a):
         value = self.visit(a.expr)
@@ -119,36 +229,31 @@ class Interpreter(jlast.AstVisitor):
 
     def visit_call(self, c):
         f = self.visit(c.f)
-        args = list(map(self.visit, c.args))
-        if not isinstance(f, JlCallable):
-            raise JlTypeError(c.location, f"{type(f).__name__} is not callable",
-                              self.backtrace, c.location)
-        arity = f.get_arity()
-        if arity is not None and len(args) != arity:
-            raise JlTypeError(f"wrong number of arguments",
-                              self.backtrace, c.location)
-        self.backtrace.append(c.location)
-        try:
-            r = f.call(self, args)
-        except JlException as e:
-            if len(e.backtrace) == 0:
-                e.backtrace = self.backtrace
-            raise e
-        
-        self.backtrace.pop()
-        if r is None:
-            return JlUnit()
-        else:
-            return r
+        args = [self.visit(a) for a in c.args]
+        if type(f) is JlClosure:
+            # all closures of a definition take the same number of arguments
+            if f.definition is not c.checked:
+                self.check_callee(f, args, c.location)
+                c.checked = f.definition
+            if c.tail:
+                return TailCall(f, args, c.location)
+            return self.call(f, args, c.location)
+        if type(f) is not JlPrimitive or f.arity is not None and f.arity != len(args):
+            self.check_callee(f, args, c.location)
+        if not f.calls_functions and self.profiler is None:
+            return self.call_primitive(f, args, c.location)
+        return self.call(f, args, c.location)
 
     def visit_fn_expr(self, f):
-        return JlClosure(self.environment, f.params, f.body)
+        env = self.environment
+        return JlClosure(env.ancestor(f.global_depth), f.params, f.body, f.frame_size,
+                         definition=f, cells=env.capture(f.captures))
 
     def visit_explain_expr(self, c):
         return self.visit(c.expr).get_comment()
 
     def visit_while_expr(self, e):
-        value = JlUnit()
+        value = unit
         while self.visit(e.cond).value:
             value = self.visit(e.body)
         return value
@@ -158,4 +263,4 @@ class Interpreter(jlast.AstVisitor):
             return self.visit(e.then_body)
         elif e.else_body is not None:
             return self.visit(e.else_body)
-        return JlUnit()
+        return unit
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from lark import ast_utils, visitors, Token
 from typing import List
 from jltypes import *
@@ -63,6 +63,9 @@ class Literal(Expr):
 class Name(Expr):
     name: str
     binding_depth: int = None
+    slot: int = None
+    # the slot holds a Cell shared with closures instead of the value
+    cell: bool = False
 
     def accept(self, visitor):
         return visitor.visit_name(self)
@@ -110,6 +113,9 @@ class WhileExpr(Expr):
 class CallExpr(Expr):
     f: Expr
     args: List[Expr]
+    tail: bool = False
+    # the definition of the closure called last, whose arity has been checked
+    checked: object = field(default=None, repr=False, compare=False)
 
     def accept(self, visitor):
         return visitor.visit_call(self)
@@ -119,6 +125,17 @@ class CallExpr(Expr):
 class FnExpr(Expr):
     params: List[Name]
     body: Expr
+    frame_size: int = None
+    # the variable the function was declared as, if any
+    name: str = None
+    # the slots of the parameters and variables of the function's own scope
+    # that closures capture, see Block
+    cell_slots: List[int] = None
+    # the variables of enclosing scopes the function uses, resolved in the
+    # scope the function is created in, and the number of frames from there
+    # to the global frame
+    captures: List["Name"] = None
+    global_depth: int = None
 
     def accept(self, visitor):
         return visitor.visit_fn_expr(self)
@@ -135,6 +152,9 @@ class ExplainExpr(Expr):
 @dataclass
 class Block(Expr):
     exprs: List[Expr]
+    frame_size: int = None
+    # the slots of the variables that closures capture, which hold cells
+    cell_slots: List[int] = None
 
     def accept(self, visitor):
         return visitor.visit_block(self)
@@ -198,7 +218,7 @@ class AstPrinter(AstVisitor):
 
     def visit_name(self, a):
         self.print_indent()
-        print(f"<{a.name} {a.binding_depth}>")
+        print(f"<{a.name} {a.binding_depth}:{a.slot}{' cell' if a.cell else ''}>")
 
     def visit_commented_expr(self, e):
         self.print_indent()
@@ -265,15 +285,22 @@ class AstPrinter(AstVisitor):
         self.indent -= 1
 
 
-class LiteralTransformer(visitors.Transformer):
+# builds the AST from the parse tree in a single bottom-up pass. The rules get the
+# meta data of their tree, which lark fills in because of propagate_positions.
+class ToAst(visitors.Transformer_NonRecursive):
     def __init__(self, filename, line_offset=0):
         super().__init__()
         self.filename = filename
         self.line_offset = line_offset
 
     def _source_loc(self, tree):
+        if getattr(tree, 'empty', False):
+            return SourceLocation(self.filename, 1 + self.line_offset, 1, 1 + self.line_offset, 1)
         return SourceLocation.from_tree(tree, self.filename, self.line_offset)
 
+    def __default__(self, data, children, meta):
+        assert False
+
     def COMMENT(self, c):
         return Literal(self._source_loc(c), JlComment(c[2:-2]))
 
@@ -284,71 +311,71 @@ class LiteralTransformer(visitors.Transformer):
         return Literal(self._source_loc(s), JlString(s[1:-1]))
 
     def TRUE(self, t):
-        return Literal(self._source_loc(t), JlBool(True))
+        return Literal(self._source_loc(t), true)
 
     def FALSE(self, f):
-        return Literal(self._source_loc(f), JlBool(False))
-
-    def unit(self, u):
-        return Literal(self._source_loc(u[0]), JlUnit())
+        return Literal(self._source_loc(f), false)
 
     def CNAME(self, n):
         return str(n)
 
-
-# would have been nice to use lark.ast_utils for this, but I couldn't figure out how to
-# maintain line and column number when using it
-class ToAst(visitors.Interpreter):
-    def __init__(self, filename, line_offset=0):
-        super().__init__()
-        self.filename = filename
-        self.line_offset = line_offset
-
-    def _source_loc(self, tree):
-        return SourceLocation.from_tree(tree, self.filename, self.line_offset)
-
-    def __default__(self, tree):
-        assert False
-        
-    def program(self, tree):
-        return Program(self._source_loc(tree), self.visit_children(tree))
-
-    def block(self, tree):
-        return Block(self._source_loc(tree), self.visit_children(tree))
-
-    def commented_expr(self, tree):
-        return CommentedExpr(self._source_loc(tree), *self.visit_children(tree))
-
-    def bin_expr(self, tree):
-        return BinExpr(self._source_loc(tree),
-                       *self.visit_children(tree))
-
-    def unary_expr(self, tree):
-        return UnaryExpr(self._source_loc(tree),
-                         *self.visit_children(tree))
-
-    def name(self, tree):
-        return Name(self._source_loc(tree), *self.visit_children(tree))
-
-    def assignment(self, tree):
-        return Assignment(self._source_loc(tree), *self.visit_children(tree))
-
-    def declaration(self, tree):
-        return Declaration(self._source_loc(tree), *self.visit_children(tree))
-
-    def if_expr(self, tree):
-        return IfExpr(self._source_loc(tree), *self.visit_children(tree))
-
-    def while_expr(self, tree):
-        return WhileExpr(self._source_loc(tree), *self.visit_children(tree))
-
-    def call_expr(self, tree):
-        children = self.visit_children(tree)
-        return CallExpr(self._source_loc(tree), children[0], children[1:])
-
-    def fn_expr(self, tree):
-        children = self.visit_children(tree)
-        return FnExpr(self._source_loc(tree), children[:-1], children[-1])
-
-    def explain_expr(self, tree):
-        return ExplainExpr(self._source_loc(tree), *self.visit_children(tree))
+    def unit(self, u):
+        return Literal(self._source_loc(u[0]), unit)
+
+    @visitors.v_args(meta=True)
+    def program(self, children, meta):
+        return Program(self._source_loc(meta), children)
+
+    @visitors.v_args(meta=True)
+    def block(self, children, meta):
+        return Block(self._source_loc(meta), children)
+
+    @visitors.v_args(meta=True)
+    def commented_expr(self, children, meta):
+        return CommentedExpr(self._source_loc(meta), *children)
+
+    @visitors.v_args(meta=True)
+    def bin_expr(self, children, meta):
+        return BinExpr(self._source_loc(meta), *children)
+
+    @visitors.v_args(meta=True)
+    def unary_expr(self, children, meta):
+        return UnaryExpr(self._source_loc(meta), *children)
+
+    @visitors.v_args(meta=True)
+    def name(self, children, meta):
+        return Name(self._source_loc(meta), *children)
+
+    @visitors.v_args(meta=True)
+    def assignment(self, children, meta):
+        return Assignment(self._source_loc(meta), *children)
+
+    @visitors.v_args(meta=True)
+    def declaration(self, children, meta):
+        name, expr = children
+        f = expr
+        while isinstance(f, CommentedExpr):
+            f = f.expr
+        if isinstance(f, FnExpr):
+            f.name = name.name
+        return Declaration(self._source_loc(meta), name, expr)
+
+    @visitors.v_args(meta=True)
+    def if_expr(self, children, meta):
+        return IfExpr(self._source_loc(meta), *children)
+
+    @visitors.v_args(meta=True)
+    def while_expr(self, children, meta):
+        return WhileExpr(self._source_loc(meta), *children)
+
+    @visitors.v_args(meta=True)
+    def call_expr(self, children, meta):
+        return CallExpr(self._source_loc(meta), children[0], children[1:])
+
+    @visitors.v_args(meta=True)
+    def fn_expr(self, children, meta):
+        return FnExpr(self._source_loc(meta), children[:-1], children[-1])
+
+    @visitors.v_args(meta=True)
+    def explain_expr(self, children, meta):
+        return ExplainExpr(self._source_loc(meta), *children)
@@ -1,38 +1,269 @@
-from dataclasses import dataclass
-from environment import Environment
+import contextlib
+import operator
+import re
+from array import array
+from collections import Counter
+from itertools import repeat
+from environment import Environment, Cell
+
+
+# templates of the auto-generated comments, `{}` is replaced by the operands
+comment_templates = {
+    "sum": "the sum of {} and {}",
+    "difference": "the difference of {} and {}",
+    "product": "the product of {} and {}",
+    "quotient": "the quotient of {} and {}",
+    "modulus": "the modulus of {} and {}",
+    "equal": "{} is equal to {}",
+    "less": "{} is less than {}",
+    "greater": "{} is greater than {}",
+    "negative": "the negative of{}",
+    "concatenation": "{} concatenated with {}",
+    "and": "{} and {}",
+    "or": "{} or {}",
+    "not": "{}, not",
+    "join": "{}{}",
+    "as_string": "{} as a string",
+    "as_comment": "{} as a comment",
+    "as_number": "{} as a number",
+    "length": "the length of {}",
+    "slice": "{} from {} to {}",
+    "as_array": "{} as an array",
+    "total": "the total of {}",
+    "minimum": "the smallest element of {}",
+    "maximum": "the largest element of {}",
+    "dot": "the dot product of {} and {}",
+    "list": "a list of {}",
+    "random": "a random integer between {} and {}",
+    "memoized": "{} with its results cached",
+    "has_key": "{} has the key {}",
+    "line_of": "a line of {}",
+}
+
+_template_fragments = {op: t.split("{}") for op, t in comment_templates.items()}
+_template_lengths = {op: len(t) - 2 * t.count("{}") for op, t in comment_templates.items()}
+
+# how much of the auto-generated comments is kept:
+#   full     everything, the comment of a value explains its whole history
+#   summary  comments are cut off with "..." after max_summary_length
+#            characters, so the comments built by loops don't grow forever
+#   none     nothing, values only get their default comment when asked
+comment_modes = ("full", "summary", "none")
+comment_mode = "full"
+max_summary_length = 100
+
+
+def set_comment_mode(mode):
+    global comment_mode
+    if mode not in comment_modes:
+        raise ValueError(f"unknown comment mode {mode!r}")
+    comment_mode = mode
+
+
+@contextlib.contextmanager
+def using_comment_mode(mode):
+    saved = comment_mode
+    set_comment_mode(mode)
+    try:
+        yield
+    finally:
+        set_comment_mode(saved)
+
+
+class CommentNode:
+    """The text of a comment that has not been rendered yet.
+
+    A node only points to its operands (comments or strings) and the
+    operation that combines them, so building a comment is O(1) no matter
+    how long the texts of the operands are."""
+    __slots__ = ("op", "operands", "size")
+
+    def __init__(self, op, *operands):
+        self.op = op
+        self.operands = operands
+
+    def __repr__(self):
+        return f"CommentNode({self.op!r})"
+
+
+def render_comment(node, limit=None):
+    # iterative, because the comments built by long loops are deeply nested.
+    # with a limit, only about the first limit characters are rendered
+    out = []
+    length = 0
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, JlComment):
+            item = item._value
+        if isinstance(item, str):
+            out.append(item)
+            if limit is not None:
+                length += len(item)
+                if length >= limit:
+                    break
+            continue
+        fragments = _template_fragments[item.op]
+        pieces = [fragments[0]]
+        for operand, fragment in zip(item.operands, fragments[1:]):
+            pieces.append(operand)
+            pieces.append(fragment)
+        stack.extend(reversed(pieces))
+    if limit is not None:
+        return "".join(out)[:limit]
+    return "".join(out)
+
+
+def comment_size(comment):
+    # the length of the text of a comment in summary mode. nodes built in
+    # another mode count as too long, so they are cut off
+    text = comment._value if isinstance(comment, JlComment) else comment
+    if isinstance(text, str):
+        return len(text)
+    return getattr(text, "size", max_summary_length + 1)
+
+
+def summary_comment(op, comments):
+    size = _template_lengths[op]
+    for comment in comments:
+        size += comment_size(comment)
+    if size <= max_summary_length:
+        node = CommentNode(op, *comments)
+        node.size = size
+        return JlComment(node)
+
+    fragments = _template_fragments[op]
+    out = [fragments[0]]
+    length = len(fragments[0])
+    for comment, fragment in zip(comments, fragments[1:]):
+        text = comment
+        if isinstance(comment, JlComment):
+            text = comment._value
+            if not isinstance(text, str):
+                # short nodes are rendered once and cached, others only partly
+                text = comment.value if hasattr(text, "size") else render_comment(text, max_summary_length)
+        out.append(text)
+        out.append(fragment)
+        length += len(text) + len(fragment)
+        if length >= max_summary_length:
+            break
+    return JlComment("".join(out)[:max_summary_length] + "...")
+
+
+def derived_comment(op, *operands):
+    """The auto-generated comment of a value computed by op from operands,
+    which are values or strings, according to comment_mode."""
+    if comment_mode == "none":
+        return None
+    comments = [o.get_comment() if isinstance(o, Value) else o for o in operands]
+    if comment_mode == "summary":
+        return summary_comment(op, comments)
+    return JlComment(CommentNode(op, *comments))
+
+
+class StringNode:
+    """The text of two strings that have been concatenated but not copied.
+
+    The operands are JlStrings, so the parts of a string that were already
+    flattened before aren't walked again."""
+    __slots__ = ("left", "right")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+
+def flatten_string(node):
+    # iterative, because strings built in a loop are deeply nested
+    out = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, JlString):
+            item = item._value
+        if isinstance(item, str):
+            out.append(item)
+        else:
+            stack.append(item.right)
+            stack.append(item.left)
+    return "".join(out)
+
 
-@dataclass
 class Value:
-    value: object = None
-    _comment: object = None
+    __slots__ = ("value", "_comment")
+
+    def __init__(self, value=None, _comment=None):
+        self.value = value
+        self._comment = _comment
+
+    def __repr__(self):
+        return f"{type(self).__name__}(value={self.value!r}, _comment={self._comment!r})"
+
+    def __copy__(self):
+        value = object.__new__(type(self))
+        value.value = self.value
+        value._comment = self._comment
+        return value
 
     def default_comment(self):
         return JlComment("something")
 
     def get_comment(self):
-        if self._comment is not None:
-            return self._comment
-        return self.default_comment()
+        comment = self._comment
+        if comment is None:
+            # the value can't change, so neither can its default comment
+            comment = self._comment = self.default_comment()
+        return comment
 
     def set_comment(self, comment):
         self._comment = comment
 
+    def with_comment(self, comment):
+        value = self.__copy__()
+        value._comment = comment
+        return value
+
     def __str__(self):
         return str(self.value)
 
     def __eq__(self, other):
+        if isinstance(other, JlArray) and not isinstance(self, JlArray):
+            # compared with every element by JlArray.__eq__
+            return NotImplemented
         if type(self) != type(other):
             res = False
         else:
             res = self.value == other.value
-        return JlBool(res, JlComment(f"{self.get_comment().value} is equal to {other.get_comment().value}"))
+        return JlBool(res, derived_comment("equal", self, other))
 
     def not_(self):
         raise TypeError()
 
-    
-@dataclass(eq=False)
+    def key(self):
+        # a hashable key that is equal for values that are equal, None for
+        # values that can't be compared by value or can change
+        return None
+
+
 class JlComment(Value):
+    __slots__ = ("_value",)
+
+    # the text is either a str or a CommentNode that is rendered on first access
+    @property
+    def value(self):
+        text = self._value
+        if not isinstance(text, str):
+            text = render_comment(text)
+            self._value = text
+        return text
+
+    @value.setter
+    def value(self, text):
+        self._value = text
+
+    def __copy__(self):
+        return JlComment(self._value, self._comment)
+
     def default_comment(self):
         return JlComment(f"a comment")
 
@@ -42,129 +273,189 @@ class JlComment(Value):
     def __add__(self, other):
         if not isinstance(other, JlComment):
             raise TypeError()
-        return JlComment(self.value + other.value)
+        return JlComment(CommentNode("join", self, other))
 
-@dataclass(eq=False)
 class JlNumber(Value):
+    __slots__ = ()
+
     def default_comment(self):
         return JlComment(f"the number {self}")
 
     def build_comment(self, name, other):
-        return JlComment(f"the {name} of {self.get_comment().value} and {other.get_comment().value}")
+        # the arithmetic is the hottest path, so full mode doesn't go through
+        # derived_comment
+        mode = comment_mode
+        if mode == "full":
+            return JlComment(CommentNode(name, self.get_comment(), other.get_comment()))
+        if mode == "none":
+            return None
+        return summary_comment(name, (self.get_comment(), other.get_comment()))
 
     def __str__(self):
         return f"{self.value:g}"
+
+    def key(self):
+        return (JlNumber, self.value)
     
     def __add__(self, other):
         if not isinstance(other, JlNumber):
-            raise TypeError()
+            return NotImplemented
         return JlNumber(self.value + other.value,
                         self.build_comment("sum", other))
 
     def __sub__(self, other):
         if not isinstance(other, JlNumber):
-            raise TypeError()
+            return NotImplemented
         return JlNumber(self.value - other.value,
                         self.build_comment("difference", other))
 
     def __mul__(self, other):
         if not isinstance(other, JlNumber):
-            raise TypeError()
+            return NotImplemented
         return JlNumber(self.value * other.value,
                         self.build_comment("product", other))
 
     def __truediv__(self, other):
         if not isinstance(other, JlNumber):
-            raise TypeError()
+            return NotImplemented
         return JlNumber(self.value / other.value,
                         self.build_comment("quotient", other))
 
     def __mod__(self, other):
         if not isinstance(other, JlNumber):
-            raise TypeError()
+            return NotImplemented
         return JlNumber(self.value % other.value,
                         self.build_comment("modulus", other))
 
     def __lt__(self, other):
         if not isinstance(other, JlNumber):
-            raise TypeError()
-        return JlBool(self.value < other.value, 
-                      JlComment(f"{self.get_comment().value} is less than {other.get_comment().value}"))
+            return NotImplemented
+        return JlBool(self.value < other.value, self.build_comment("less", other))
 
     def __gt__(self, other):
         if not isinstance(other, JlNumber):
-            raise TypeError()
-        return JlBool(self.value > other.value, 
-                      JlComment(f"{self.get_comment().value} is greater than {other.get_comment().value}"))
+            return NotImplemented
+        return JlBool(self.value > other.value, self.build_comment("greater", other))
     
     def __neg__(self):
-        return JlNumber(-self.value,
-                       JlComment(f"the negative of{self.get_comment().value}"))
+        return JlNumber(-self.value, derived_comment("negative", self))
 
 
-@dataclass(eq=False)
 class JlString(Value):
+    __slots__ = ("_value",)
+
+    # shorter strings are cheaper to copy right away than to concatenate lazily
+    min_lazy_length = 256
+
+    # the text is either a str or a StringNode that is flattened on first access
+    @property
+    def value(self):
+        text = self._value
+        if not isinstance(text, str):
+            text = flatten_string(text)
+            self._value = text
+        return text
+
+    @value.setter
+    def value(self, text):
+        self._value = text
+
+    def __copy__(self):
+        return JlString(self._value, self._comment)
+
     def default_comment(self):
         return JlComment(f"the string \"{self.value}\"")
 
+    def key(self):
+        return (JlString, self.value)
+
     def __add__(self, other):
         if not isinstance(other, JlString):
             raise TypeError()
-        return JlString(self.value + other.value,
-                        JlComment(f"{self.get_comment().value} concatenated with {other.get_comment().value}"))
+        comment = derived_comment("concatenation", self, other)
+        left, right = self._value, other._value
+        if isinstance(left, str) and isinstance(right, str) \
+           and len(left) + len(right) < self.min_lazy_length:
+            return JlString(left + right, comment)
+        return JlString(StringNode(self, other), comment)
 
 
 
-@dataclass(eq=False)
 class JlUnit(Value):
+    __slots__ = ()
+
     def default_comment(self):
         return JlComment("the unit")
 
     def __str__(self):
         return "()"
 
+    def key(self):
+        return (JlUnit, None)
+
 
-@dataclass(eq=False)
 class JlBool(Value):
+    __slots__ = ()
+
     def default_comment(self):
         return JlComment(f"the boolean \"{self.value}\"")
 
     def __str__(self):
         return str(self.value)
 
+    def key(self):
+        return (JlBool, self.value)
+
     def __and__(self, other):
         if not isinstance(other, JlBool):
             raise TypeError()
         return JlBool(self.value and other.value,
-                      JlComment(f"{self.get_comment().value} and {other.get_comment().value}"))
+                      derived_comment("and", self, other))
 
     def __or__(self, other):
         if not isinstance(other, JlBool):
             raise TypeError()
         return JlBool(self.value or other.value,
-                      JlComment(f"{self.get_comment().value} or {other.get_comment().value}"))
+                      derived_comment("or", self, other))
 
     def not_(self):
         return JlBool(not self.value,
-                      JlComment(f"{self.get_comment().value}, not"))
+                      derived_comment("not", self))
+
+
+# values with their default comment are never changed in place, so these are
+# shared instead of allocating new ones. with_comment() makes a copy.
+unit = JlUnit()
+true = JlBool(True)
+false = JlBool(False)
 
 class JlCallable(Value):
-    pass
+    __slots__ = ()
 
 
 class JlPrimitive(JlCallable):
-    def __init__(self, callback, arity=None, comment=None):
+    __slots__ = ("callback", "arity", "calls_functions")
+
+    def __init__(self, callback, arity=None, comment=None, calls_functions=False):
         super().__init__(None, comment)
         self.callback = callback
         self.arity = arity
+        # the callbacks of primitives that call functions are generators.
+        # they yield every function they call with a list of the arguments
+        # and are sent the result, see Interpreter.call_back
+        self.calls_functions = calls_functions
+
+    def __copy__(self):
+        return JlPrimitive(self.callback, self.arity, self._comment, self.calls_functions)
 
     def __eq__(self, other):
-        return JlBool(self is other,
-                      JlComment(f"{self.get_comment().value} is equal to {other.get_comment().value}"))
+        return JlBool(self is other, derived_comment("equal", self, other))
     def __repr__(self):
         return f"JlPrimitive({self.get_comment()})"
 
     def call(self, interpreter, args):
+        if self.calls_functions:
+            return interpreter.call_back(self.callback(*args))
         return self.callback(*args)
 
     def get_arity(self):
@@ -172,33 +463,346 @@ class JlPrimitive(JlCallable):
 
 
 class JlClosure(JlCallable):
-    def __init__(self, environment, params, body, comment=None):
+    __slots__ = ("environment", "params", "body", "frame_size", "definition", "cells")
+
+    def __init__(self, environment, params, body, frame_size, comment=None, definition=None, cells=()):
         super().__init__(None, comment)
+        # the global frame
         self.environment = environment
         self.params = params
         self.body = body
+        self.frame_size = frame_size
+        # the FnExpr the closure was created from
+        self.definition = definition
+        # the captured variables, see Environment
+        self.cells = cells
+
+    def __copy__(self):
+        return JlClosure(self.environment, self.params, self.body, self.frame_size,
+                         self._comment, self.definition, self.cells)
 
     def __str__(self):
         return "JlClosure({self.get_comment()})"
 
-    def call(self, interpreter, args):
-        env = Environment(self.environment)
+    def frame(self, args):
+        env = Environment(self.environment, self.frame_size)
+        values = env.values
         for p, a in zip(self.params, args):
-            env.put(p, a, 0)
-        return interpreter.eval_with_env(self.body, env)
+            values[p.slot] = a
+        cell_slots = self.definition.cell_slots
+        if cell_slots:
+            for slot in cell_slots:
+                values[slot] = Cell(values[slot])
+        if self.cells:
+            values[self.frame_size - len(self.cells):] = self.cells
+        return env
+
+    def call(self, interpreter, args):
+        return interpreter.eval_with_env(self.body, self.frame(args))
 
     def get_arity(self):
         return len(self.params)
 
 
 class JlList(Value):
+    """A list of values.
+
+    The number of elements of each type is kept up to date, so longer lists
+    can be explained in constant time by their length and the type of their
+    elements instead of the comments of all elements. That's why the list
+    must only be changed with the methods below."""
+    __slots__ = ("types",)
+
+    # longer lists are not explained element by element
+    max_explained = 10
+
+    def __init__(self, value=None, _comment=None):
+        super().__init__([] if value is None else value, _comment)
+        self.types = Counter(map(type, self.value))
+
+    def __copy__(self):
+        # the copy shares the elements, so it has to share their counts too
+        value = JlList.__new__(JlList)
+        value.value = self.value
+        value._comment = self._comment
+        value.types = self.types
+        return value
+
+    def append(self, value):
+        self.value.append(value)
+        self.types[type(value)] += 1
+
+    def extend(self, values):
+        # counted first, values may be this list itself
+        self.types.update(map(type, values))
+        self.value.extend(values)
+
+    def put(self, i, value):
+        self.types[type(self.value[i])] -= 1
+        self.value[i] = value
+        self.types[type(value)] += 1
+
+    def get_comment(self):
+        if self._comment is not None:
+            return self._comment
+        return self.default_comment()
+
     def default_comment(self):
         if len(self.value) == 0:
             return JlComment("an empty list")
-        vals = " and ".join([v.get_comment().value for v in self.value])
-        return JlComment(f"a list of {vals}")
+        if len(self.value) > self.max_explained:
+            types = [t for t, count in self.types.items() if count > 0]
+            kind = type_names.get(types[0], "values") if len(types) == 1 else "values"
+            return JlComment(f"a list of {len(self.value)} {kind}")
+        vals = self.value[0].get_comment()
+        for v in self.value[1:]:
+            vals = CommentNode("and", vals, v.get_comment())
+        return JlComment(CommentNode("list", vals))
 
     def __str__(self):
         vals = ", ".join(map(str, self.value))
         return "[" + vals + "]"
+
+
+class JlArray(Value):
+    """A packed array of numbers.
+
+    Arithmetic and comparisons work element by element, on two arrays of the
+    same length or on an array and a number. The result has a single comment
+    for the whole array, so computing with arrays doesn't create a value and
+    a comment per element."""
+    __slots__ = ()
+
+    def default_comment(self):
+        return JlComment(f"an array of {len(self.value)} numbers")
+
+    def __str__(self):
+        return "[" + ", ".join(f"{v:g}" for v in self.value) + "]"
+
+    def elementwise(self, other, op, name, reflected=False):
+        if isinstance(other, JlArray):
+            if len(other.value) != len(self.value):
+                raise TypeError()
+            others = other.value
+        elif isinstance(other, JlNumber):
+            others = repeat(other.value, len(self.value))
+        else:
+            return NotImplemented
+        if reflected:
+            values = map(op, others, self.value)
+            comment = derived_comment(name, other, self)
+        else:
+            values = map(op, self.value, others)
+            comment = derived_comment(name, self, other)
+        return JlArray(array('d', values), comment)
+
+    def __add__(self, other):
+        return self.elementwise(other, operator.add, "sum")
+
+    def __radd__(self, other):
+        return self.elementwise(other, operator.add, "sum", True)
+
+    def __sub__(self, other):
+        return self.elementwise(other, operator.sub, "difference")
+
+    def __rsub__(self, other):
+        return self.elementwise(other, operator.sub, "difference", True)
+
+    def __mul__(self, other):
+        return self.elementwise(other, operator.mul, "product")
+
+    def __rmul__(self, other):
+        return self.elementwise(other, operator.mul, "product", True)
+
+    def __truediv__(self, other):
+        return self.elementwise(other, operator.truediv, "quotient")
+
+    def __rtruediv__(self, other):
+        return self.elementwise(other, operator.truediv, "quotient", True)
+
+    def __mod__(self, other):
+        return self.elementwise(other, operator.mod, "modulus")
+
+    def __rmod__(self, other):
+        return self.elementwise(other, operator.mod, "modulus", True)
+
+    # the comparisons are also called for `number < array` and so on,
+    # with the operands swapped
+    def __lt__(self, other):
+        return self.elementwise(other, operator.lt, "less")
+
+    def __gt__(self, other):
+        return self.elementwise(other, operator.gt, "greater")
+
+    def __eq__(self, other):
+        result = self.elementwise(other, operator.eq, "equal")
+        if result is NotImplemented:
+            return JlBool(False, derived_comment("equal", self, other))
+        return result
+
+    def __neg__(self):
+        return JlArray(array('d', map(operator.neg, self.value)),
+                       derived_comment("negative", self))
+
+
+class JlDict(Value):
+    """A hash map from values that have a key (see Value.key) to values.
+
+    The dict maps the key of every entry to the pair of the key value and
+    the value, so keys are returned with the comments they were put in
+    with. Like lists, dicts are changed in place and only equal to
+    themselves."""
+    __slots__ = ()
+
+    def __init__(self, value=None, _comment=None):
+        super().__init__({} if value is None else value, _comment)
+
+    def get_comment(self):
+        # the default comment changes with the entries, see JlList
+        if self._comment is not None:
+            return self._comment
+        return self.default_comment()
+
+    def default_comment(self):
+        if len(self.value) == 0:
+            return JlComment("an empty dict")
+        return JlComment(f"a dict of {len(self.value)} entries")
+
+    def __str__(self):
+        return "{" + ", ".join(f"{k}: {v}" for k, v in self.value.values()) + "}"
+
+    def __eq__(self, other):
+        return JlBool(self is other, derived_comment("equal", self, other))
+
+
+class JlFile(Value):
+    """A file opened by open. The lines read from it all share a single
+    comment, which is only rendered if it is asked for."""
+    __slots__ = ("line_comment",)
+
+    def __init__(self, value=None, _comment=None):
+        super().__init__(value, _comment)
+        self.line_comment = derived_comment("line_of", self)
+
+    def __copy__(self):
+        value = JlFile.__new__(JlFile)
+        value.value = self.value
+        value._comment = self._comment
+        value.line_comment = self.line_comment
+        return value
+
+    def default_comment(self):
+        return JlComment(f"the file \"{self.value.name}\"")
+
+    def __str__(self):
+        return f"<file {self.value.name}>"
+
+    def read_line(self):
+        # the next line without its line break, None at the end of the file
+        line = self.value.readline()
+        if not line:
+            return None
+        if line[-1] == "\n":
+            line = line[:-1]
+        return JlString(line, self.line_comment)
+
+
+class JlLines(Value):
+    """The lines of a file, read one by one with next."""
+    __slots__ = ()
+
+    def default_comment(self):
+        return JlComment(f"the lines of {self.value.get_comment().value}")
+
+    def __str__(self):
+        return f"<lines of {self.value.value.name}>"
+
+
+class JlMapped(Value):
+    """A read-only file mapped into memory by mmap_open, indexed by lines or
+    by bytes.
+
+    The value is the mmap. For lines, an index of the offset of every line
+    is built on first use. Nothing is copied out of the mapping until a
+    line, byte or slice is read."""
+    __slots__ = ("name", "by_lines", "_offsets", "line_comment")
+
+    def __init__(self, value, name, by_lines=True, _comment=None):
+        super().__init__(value, _comment)
+        self.name = name
+        self.by_lines = by_lines
+        self._offsets = None
+        self.line_comment = derived_comment("line_of", self)
+
+    def __copy__(self):
+        value = JlMapped(self.value, self.name, self.by_lines, self._comment)
+        value._offsets = self._offsets
+        return value
+
+    def default_comment(self):
+        return JlComment(f"the mapped file \"{self.name}\"")
+
+    def __str__(self):
+        return f"<mapped file {self.name}>"
+
+    @property
+    def offsets(self):
+        # the offsets at which the lines start
+        if self._offsets is None:
+            data = self.value
+            offsets = array('q', [0])
+            offsets.extend(match.end() for match in re.finditer(b"\n", data))
+            # a line break at the end doesn't start another line
+            if offsets[-1] == len(data):
+                offsets.pop()
+            self._offsets = offsets
+        return self._offsets
+
+    def length(self):
+        return len(self.offsets) if self.by_lines else len(self.value)
+
+    def line(self, i):
+        offsets = self.offsets
+        start = offsets[i]
+        end = offsets[i + 1] - 1 if i + 1 < len(offsets) else len(self.value)
+        text = self.value[start:end].decode("utf-8", "replace")
+        if text.endswith("\n"):
+            text = text[:-1]
+        return JlString(text, self.line_comment)
+
+    def get(self, i):
+        # the line or byte at i, negative indices count from the end. None if
+        # there is none
+        n = self.length()
+        if not -n <= i < n:
+            return None
+        i %= n
+        if self.by_lines:
+            return self.line(i)
+        return JlNumber(self.value[i])
+
+    def slice(self, start, end):
+        # lines give a list, bytes a string
+        if self.by_lines:
+            return JlList([self.line(i) for i in range(self.length())[start:end]])
+        return JlString(self.value[start:end].decode("utf-8", "replace"),
+                        derived_comment("slice", self, str(start), str(end)))
+
+
+# how the elements of long lists are called in their comment
+type_names = {
+    JlNumber: "numbers",
+    JlString: "strings",
+    JlBool: "booleans",
+    JlUnit: "units",
+    JlComment: "comments",
+    JlList: "lists",
+    JlArray: "arrays",
+    JlDict: "dicts",
+    JlFile: "files",
+    JlLines: "lines",
+    JlMapped: "mapped files",
+    JlPrimitive: "functions",
+    JlClosure: "functions",
+}
         
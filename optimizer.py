@@ -0,0 +1,173 @@
+from jlast import *
+from jltypes import JlComment, unit
+from closure_compiler import binary_operators, unary_operators
+
+
+class ConstantFolder(AstVisitor):
+    """Folds expressions that only depend on literals into literals.
+
+    Runs after the resolver. Every visit returns the (possibly new) node
+    that replaces the visited one. The folded values are computed by the
+    same operators the interpreter uses, so they carry the same comments,
+    which are rendered right away instead of on every evaluation. Anything
+    that would fail at runtime is left alone, so errors are still reported
+    when and where they happen."""
+
+    def fold(self, location, compute):
+        try:
+            value = compute()
+        except Exception:
+            return None
+        # render the comment now, so it isn't rendered again at runtime
+        value.get_comment().value
+        return Literal(location, value)
+
+    def visit_program(self, b):
+        b.exprs = [self.visit(e) for e in b.exprs]
+        return b
+
+    def visit_block(self, b):
+        b.exprs = [self.visit(e) for e in b.exprs]
+        return b
+
+    def visit_commented_expr(self, e):
+        e.expr = self.visit(e.expr)
+        e.comment = self.visit(e.comment)
+        if isinstance(e.expr, Literal) and isinstance(e.comment, Literal) \
+           and isinstance(e.comment.value, JlComment):
+            return Literal(e.location, e.expr.value.with_comment(e.comment.value))
+        return e
+
+    def visit_assignment(self, a):
+        a.expr = self.visit(a.expr)
+        return a
+
+    def visit_declaration(self, d):
+        d.expr = self.visit(d.expr)
+        return d
+
+    def visit_literal(self, l):
+        return l
+
+    def visit_name(self, n):
+        return n
+
+    def visit_bin_expr(self, e):
+        e.lhs = self.visit(e.lhs)
+        e.rhs = self.visit(e.rhs)
+        if isinstance(e.lhs, Literal) and isinstance(e.rhs, Literal):
+            op = binary_operators[e.op]
+            folded = self.fold(e.location, lambda: op(e.lhs.value, e.rhs.value))
+            if folded is not None:
+                return folded
+        return e
+
+    def visit_unary_expr(self, e):
+        e.expr = self.visit(e.expr)
+        if isinstance(e.expr, Literal):
+            op = unary_operators[e.op]
+            folded = self.fold(e.location, lambda: op(e.expr.value))
+            if folded is not None:
+                return folded
+        return e
+
+    def visit_call(self, c):
+        c.f = self.visit(c.f)
+        c.args = [self.visit(a) for a in c.args]
+        return c
+
+    def visit_fn_expr(self, f):
+        f.body = self.visit(f.body)
+        return f
+
+    def visit_explain_expr(self, c):
+        c.expr = self.visit(c.expr)
+        if isinstance(c.expr, Literal):
+            return Literal(c.location, c.expr.value.get_comment())
+        return c
+
+    def visit_while_expr(self, e):
+        e.cond = self.visit(e.cond)
+        e.body = self.visit(e.body)
+        if isinstance(e.cond, Literal) and not e.cond.value.value:
+            return Literal(e.location, unit)
+        return e
+
+    def visit_if_expr(self, e):
+        e.cond = self.visit(e.cond)
+        e.then_body = self.visit(e.then_body)
+        if e.else_body is not None:
+            e.else_body = self.visit(e.else_body)
+        if isinstance(e.cond, Literal):
+            if e.cond.value.value:
+                return e.then_body
+            if e.else_body is not None:
+                return e.else_body
+            return Literal(e.location, unit)
+        return e
+
+
+class CommentUse(AstVisitor):
+    """Finds out if a program might look at the auto-generated comments.
+
+    They are only observable through `?`, `cmnt` and print with a single
+    argument. Any other use of print or cmnt, like passing them to another
+    function, counts too. Every visit returns a bool."""
+
+    observers = ("print", "cmnt")
+
+    def any(self, exprs):
+        return any(self.visit(e) for e in exprs)
+
+    def visit_program(self, b):
+        return self.any(b.exprs)
+
+    def visit_block(self, b):
+        return self.any(b.exprs)
+
+    def visit_commented_expr(self, e):
+        return self.visit(e.expr) or self.visit(e.comment)
+
+    def visit_assignment(self, a):
+        return self.visit(a.expr)
+
+    def visit_declaration(self, d):
+        return self.visit(d.expr)
+
+    def visit_literal(self, l):
+        return False
+
+    def visit_name(self, n):
+        return n.name in self.observers
+
+    def visit_bin_expr(self, e):
+        return self.visit(e.lhs) or self.visit(e.rhs)
+
+    def visit_unary_expr(self, e):
+        return self.visit(e.expr)
+
+    def visit_call(self, c):
+        if isinstance(c.f, Name) and c.f.name == "print" and len(c.args) != 1:
+            # print(a, b) only prints the values
+            return self.any(c.args)
+        return self.visit(c.f) or self.any(c.args)
+
+    def visit_fn_expr(self, f):
+        return self.visit(f.body)
+
+    def visit_explain_expr(self, c):
+        return True
+
+    def visit_while_expr(self, e):
+        return self.visit(e.cond) or self.visit(e.body)
+
+    def visit_if_expr(self, e):
+        return self.visit(e.cond) or self.visit(e.then_body) \
+            or (e.else_body is not None and self.visit(e.else_body))
+
+
+def comment_mode_for(mode, ast):
+    # the comments are only left out if the program can't tell
+    if mode == "none" and CommentUse().visit(ast):
+        return "full"
+    return mode
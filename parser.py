@@ -64,4 +64,7 @@ block      : "{" (expr ";")* [expr]"}"
 
 """
 
-parser = lark.Lark(grammar, start='program', parser='lalr', propagate_positions=True)
+# cache=True stores the LALR tables in the temp directory, so they are only
+# computed once instead of on every start of the interpreter
+parser = lark.Lark(grammar, start='program', parser='lalr', propagate_positions=True,
+                   cache=True)
@@ -1,37 +1,69 @@
 #!/usr/bin/env python3
 
+import gc
+import os
+import sys
 import lark
 import argparse
 import readline
 
 from parser import parser
-from jlast import LiteralTransformer, ToAst, AstPrinter
-from interpreter import Interpreter
+from jlast import ToAst, AstPrinter
+from engines import engines
 from resolver import Resolver
-from exceptions import JlException, format_backtrace
-from jltypes import JlUnit, JlComment
-
-
-def eval_source(filename, interpreter, source, debug=True, full_source=None, line_offset=0):
-    if full_source is None:
-        full_source = source
-        
+from optimizer import ConstantFolder, comment_mode_for
+from ast_cache import AstCache
+from profiler import Profiler
+from batch import run_batch
+from exceptions import JlException, SourceLines, format_backtrace
+from jltypes import JlUnit, JlComment, comment_modes, using_comment_mode
+
+
+def parse_source(filename, source, line_offset=0, debug=False):
+    # the parse tree and the AST don't contain cycles, so running the garbage
+    # collector while building them only makes parsing large files quadratic
+    gc_enabled = gc.isenabled()
+    gc.disable()
     try:
         parse_tree = parser.parse(source)
         if debug:
             print("Parse Tree:")
             print(parse_tree.pretty())
             print()
-    
-        tree_with_literals = LiteralTransformer(filename, line_offset).transform(parse_tree)
-        ast = ToAst(filename, line_offset).visit(tree_with_literals)
-        Resolver(interpreter.environment).visit(ast)
+
+        return ToAst(filename, line_offset).transform(parse_tree)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def eval_source(filename, interpreter, source, debug=True, full_source=None, line_offset=0,
+                optimize=True, cache=None, comments="full"):
+    if full_source is None:
+        full_source = source
+        
+    try:
+        ast = None
+        if cache is not None:
+            ast = cache.load(filename, source, optimize, interpreter.environment)
+
+        if ast is None:
+            ast = parse_source(filename, source, line_offset, debug)
+            Resolver(interpreter.environment).visit(ast)
+            if optimize:
+                ast = ConstantFolder().visit(ast)
+            if cache is not None:
+                cache.store(filename, source, optimize, ast, interpreter.environment)
+
         if debug:
             print("Abstract Syntax Tree:")
             AstPrinter().visit(ast)
             print()
 
-        value = interpreter.visit(ast)
+        with using_comment_mode(comment_mode_for(comments, ast)):
+            if interpreter.profiler is not None:
+                interpreter.profiler.start()
+            value = interpreter.visit(ast)
 
         if debug:
             print("Global Environment after Evaluation:")
@@ -59,21 +91,42 @@ def eval_source(filename, interpreter, source, debug=True, full_source=None, lin
     return JlUnit(JlComment(":("))
 
 
-def run_file(path, debug=False):
+def write_profile(profiler, prefix, source):
+    profiler.stop()
+    with open(prefix + ".txt", "w") as f:
+        f.write(profiler.report(source))
+    with open(prefix + ".collapsed", "w") as f:
+        f.write(profiler.collapsed_stacks())
+    print(f"profile written to {prefix}.txt and {prefix}.collapsed", file=sys.stderr)
+
+
+def run_file(path, debug=False, engine="tree", optimize=True, max_depth=None, cache=True,
+             profile=None, comments="full"):
     with open(path) as f:
         source = f.read()
 
-    i = Interpreter()
-    value = eval_source(path, i, source, debug=debug)
+    i = engines[engine](max_depth)
+    if profile is not None:
+        i.profiler = Profiler(path)
+    ast_cache = AstCache() if cache and not debug else None
+    value = eval_source(path, i, source, debug=debug, optimize=optimize, cache=ast_cache,
+                        comments=comments)
     if debug:
         print("Program Return Value:")
         print(value)
-
-
-def repl(debug=True, quiet=False):
-    inter = Interpreter()
-    full_source = ""
-    line_offset = 0
+    if profile is not None:
+        write_profile(i.profiler, profile, source)
+
+
+def repl(debug=True, quiet=False, engine="tree", optimize=True, max_depth=None, history=None,
+         comments="full"):
+    inter = engines[engine](max_depth)
+    if comments == "none" and not quiet:
+        # the comment of every result is printed
+        comments = "full"
+    # all inputs so far, for the backtraces of errors in functions defined by
+    # earlier inputs
+    full_source = SourceLines(max_lines=history)
     while True:
         try:
             source = input('>>> ')
@@ -83,13 +136,13 @@ def repl(debug=True, quiet=False):
         except EOFError:
             print()
             break
-        full_source += source + '\n'
-        value = eval_source("<repl>", inter, source, debug, full_source, line_offset)
+        line_offset = full_source.append(source) - 1
+        value = eval_source("<repl>", inter, source, debug, full_source, line_offset, optimize,
+                            comments=comments)
         if not quiet:
             print("->", value, value.get_comment())
 
-        inter.clear_backtrace()
-        line_offset += 1
+        inter.reset()
 
 
 if __name__ == "__main__":
@@ -101,8 +154,37 @@ if __name__ == "__main__":
                       help="print verbose debug info")
     argp.add_argument("-q", "--quiet", default=False, action="store_true",
                       help="don't print result of expressions when in interactive mode")
+    argp.add_argument("--engine", default="tree", choices=engines.keys(),
+                      help="evaluate by walking the AST, by compiling it to closures or by compiling it to bytecode")
+    argp.add_argument("--no-opt", dest="optimize", default=True, action="store_false",
+                      help="don't fold constant expressions before evaluation")
+    argp.add_argument("--max-depth", type=int, default=None,
+                      help="maximum depth of nested function calls (default: 1000, 100000 with --engine=vm)")
+    argp.add_argument("--no-cache", dest="cache", default=True, action="store_false",
+                      help="don't cache the parsed program on disk")
+    argp.add_argument("--comments", default="full", choices=comment_modes,
+                      help="keep the whole auto-generated comments, cut them off after a few words, or leave them out if the program never looks at them")
+    argp.add_argument("--batch", metavar="DIR",
+                      help="run all .pe files in DIR and print a JSON line with the output, value or error and time of each")
+    argp.add_argument("-j", "--jobs", type=int, default=None,
+                      help="number of processes running programs of --batch in parallel (default: number of CPUs)")
+    argp.add_argument("--history", type=int, default=None, metavar="LINES",
+                      help="only keep this many lines of interactive input to show in error messages")
+    argp.add_argument("--profile", default=False, action="store_true",
+                      help="measure the time spent in every function and write a report and a flamegraph input file")
+    argp.add_argument("--profile-output", default=None, metavar="PREFIX",
+                      help="write the profile to PREFIX.txt and PREFIX.collapsed (default: the name of the program)")
     args = argp.parse_args()
-    if args.file is not None:
-        run_file(args.file, args.debug)
+    if args.batch is not None:
+        failed = run_batch(args.batch, args.jobs, args.engine, args.optimize, args.max_depth,
+                           args.comments)
+        sys.exit(1 if failed else 0)
+    elif args.file is not None:
+        profile = None
+        if args.profile:
+            profile = args.profile_output or os.path.basename(args.file) + ".profile"
+        run_file(args.file, args.debug, args.engine, args.optimize, args.max_depth, args.cache, profile,
+                 args.comments)
     else:
-        repl(args.debug, args.quiet)
+        repl(args.debug, args.quiet, args.engine, args.optimize, args.max_depth, args.history,
+             args.comments)
@@ -1,7 +1,14 @@
+import mmap
+import operator
+import os
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from math import fsum
 from random import randint
 from environment import Environment
 from jltypes import *
-from exceptions import JlTypeError
+from exceptions import JlTypeError, JlIOError
 
 
 def jl_print(*args):
@@ -18,23 +25,23 @@ def jl_input():
 
 def jl_str(arg):
     return JlString(str(arg),
-                    JlComment(f"{arg.get_comment().value} as a string"))
+                    derived_comment("as_string", arg))
 
 
 def jl_cmnt(arg):
     return JlComment(str(arg),
-                     JlComment(f"{arg.get_comment().value} as a comment"))
+                     derived_comment("as_comment", arg))
 
 
 def jl_num(arg):
     try:
         if isinstance(arg, JlString):
             return JlNumber(float(arg.value),
-                            JlComment(f"{arg.get_comment().value} as a number"))
+                            derived_comment("as_number", arg))
     except ValueError:
         pass
 
-    return JlUnit()
+    return unit
 
 
 def jl_list(*args):
@@ -44,36 +51,392 @@ def jl_list(*args):
 def jl_append(list, value):
     if not isinstance(list, JlList):
         raise JlTypeError("first argument must be a list")
-    return list.value.append(value)
+    list.append(value)
 
 
 def jl_put(list, index, value):
-    if not isinstance(list, JlList):
-        raise JlTypeError("first argument must be a list")
+    if not isinstance(list, JlList) and not isinstance(list, JlArray):
+        raise JlTypeError("first argument must be a list or array")
     if not isinstance(index, JlNumber):
         raise JlTypeError("second argument must be a number")
     i = int(index.value)
-    if i < len(list.value):
-        list.value[i] = value
+    if i < 0:
+        raise JlTypeError("second argument must not be negative")
+    if isinstance(list, JlArray):
+        if not isinstance(value, JlNumber):
+            raise JlTypeError("only numbers can be put into an array")
+        if i < len(list.value):
+            list.value[i] = value.value
+    elif i < len(list.value):
+        list.put(i, value)
     return value
 
 
 def jl_get(list, index):
-    if not isinstance(list, JlList):
-        raise JlTypeError("first argument must be a list")
+    if not isinstance(list, (JlList, JlArray, JlMapped)):
+        raise JlTypeError("first argument must be a list, array or mapped file")
     if not isinstance(index, JlNumber):
         raise JlTypeError("second argument must be a number")
     i = int(index.value)
+    if isinstance(list, JlMapped):
+        value = list.get(i)
+        return unit if value is None else value
+    if i < 0:
+        raise JlTypeError("second argument must not be negative")
     if i < len(list.value):
+        if isinstance(list, JlArray):
+            return JlNumber(list.value[i])
         return list.value[i]
-    return JlUnit()
+    return unit
 
 
 def jl_len(list):
-    if not isinstance(list, JlList) and not isinstance(list, JlString):
-        raise JlTypeError("first argument must be a list or string")
+    if isinstance(list, JlMapped):
+        return JlNumber(list.length(), derived_comment("length", list))
+    if not isinstance(list, (JlList, JlString, JlArray, JlDict)):
+        raise JlTypeError("first argument must be a list, string, array, dict or mapped file")
     return JlNumber(len(list.value),
-                    JlComment(f"the length of {list.get_comment().value}"))
+                    derived_comment("length", list))
+
+
+def jl_slice(seq, start, end):
+    if not isinstance(seq, (JlList, JlString, JlArray, JlMapped)):
+        raise JlTypeError("first argument must be a list, string, array or mapped file")
+    if not isinstance(start, JlNumber):
+        raise JlTypeError("second argument must be a number")
+    if not isinstance(end, JlNumber):
+        raise JlTypeError("third argument must be a number")
+    if isinstance(seq, JlMapped):
+        return seq.slice(int(start.value), int(end.value))
+    part = seq.value[int(start.value):int(end.value)]
+    if isinstance(seq, JlList):
+        return JlList(part)
+    if isinstance(seq, JlArray):
+        return JlArray(part)
+    return JlString(part,
+                    derived_comment("slice", seq, str(start), str(end)))
+
+
+def jl_extend(list, other):
+    if not isinstance(list, JlList):
+        raise JlTypeError("first argument must be a list")
+    if not isinstance(other, JlList):
+        raise JlTypeError("second argument must be a list")
+    list.extend(other.value)
+
+
+# map, filter, fold and the functions made by memo call functions, so they
+# are generators, see JlPrimitive
+
+
+def jl_map(list, f):
+    if not isinstance(list, JlList):
+        raise JlTypeError("first argument must be a list")
+    values = []
+    for v in list.value:
+        values.append((yield f, [v]))
+    return JlList(values)
+
+
+def jl_filter(list, f):
+    if not isinstance(list, JlList):
+        raise JlTypeError("first argument must be a list")
+    values = []
+    for v in list.value:
+        if (yield f, [v]).value:
+            values.append(v)
+    return JlList(values)
+
+
+def jl_fold(list, initial, f):
+    if not isinstance(list, JlList):
+        raise JlTypeError("first argument must be a list")
+    acc = initial
+    for v in list.value:
+        acc = yield f, [acc, v]
+    return acc
+
+
+class Memo:
+    """The callback of a function made by memo. Results are cached by the
+    keys of the arguments (see Value.key), and the least recently used one is
+    evicted once there are more than maxsize. Calls with arguments that have
+    no key, like lists, aren't cached. A cached result is returned as it is,
+    so it keeps the comment of the first call."""
+
+    def __init__(self, f, maxsize):
+        self.f = f
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, *args):
+        key = tuple(arg.key() for arg in args)
+        if None in key:
+            return (yield self.f, list(args))
+        cache = self.cache
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = yield self.f, list(args)
+        cache[key] = value
+        if self.maxsize is not None and len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return value
+
+
+def jl_memo(*args):
+    if len(args) not in (1, 2):
+        raise JlTypeError("memo takes a function and optionally the size of the cache")
+    f, maxsize = args[0], args[1] if len(args) == 2 else None
+    if not isinstance(f, JlCallable):
+        raise JlTypeError("first argument must be a function")
+    if maxsize is not None:
+        if not isinstance(maxsize, JlNumber) or maxsize.value < 1:
+            raise JlTypeError("second argument must be a positive number")
+        maxsize = int(maxsize.value)
+    return JlPrimitive(Memo(f, maxsize), f.get_arity(), derived_comment("memoized", f),
+                       calls_functions=True)
+
+
+def jl_memo_stats(f):
+    if not isinstance(f, JlPrimitive) or not isinstance(f.callback, Memo):
+        raise JlTypeError("first argument must be a function made by memo")
+    memo = f.callback
+    return JlList([JlNumber(memo.hits), JlNumber(memo.misses), JlNumber(len(memo.cache))],
+                  JlComment("the hits, misses and size of a memo cache"))
+
+
+def dict_key(key):
+    k = key.key()
+    if k is None:
+        raise JlTypeError("keys must be numbers, strings, booleans or ()")
+    return k
+
+
+def jl_dict(*args):
+    if len(args) % 2 != 0:
+        raise JlTypeError("dict takes pairs of keys and values")
+    d = JlDict()
+    for key, value in zip(args[::2], args[1::2]):
+        d.value[dict_key(key)] = (key, value)
+    return d
+
+
+def jl_dget(d, key):
+    if not isinstance(d, JlDict):
+        raise JlTypeError("first argument must be a dict")
+    entry = d.value.get(dict_key(key))
+    if entry is None:
+        return unit
+    return entry[1]
+
+
+def jl_dput(d, key, value):
+    if not isinstance(d, JlDict):
+        raise JlTypeError("first argument must be a dict")
+    d.value[dict_key(key)] = (key, value)
+    return value
+
+
+def jl_has(d, key):
+    if not isinstance(d, JlDict):
+        raise JlTypeError("first argument must be a dict")
+    return JlBool(dict_key(key) in d.value, derived_comment("has_key", d, key))
+
+
+def jl_keys(d):
+    if not isinstance(d, JlDict):
+        raise JlTypeError("first argument must be a dict")
+    return JlList([key for key, _ in d.value.values()])
+
+
+def jl_del(d, key):
+    if not isinstance(d, JlDict):
+        raise JlTypeError("first argument must be a dict")
+    entry = d.value.pop(dict_key(key), None)
+    if entry is None:
+        return unit
+    return entry[1]
+
+
+# files are read and written in blocks of this many bytes
+block_size = 1 << 16
+
+
+@contextmanager
+def io_errors():
+    try:
+        yield
+    except (OSError, ValueError) as e:
+        # ValueError for closed files and undecodable text
+        raise JlIOError(str(e))
+
+
+def check_file(f):
+    if not isinstance(f, JlFile):
+        raise JlTypeError("first argument must be a file")
+
+
+def jl_open(*args):
+    if len(args) not in (1, 2):
+        raise JlTypeError("open takes a path and optionally a mode")
+    path, mode = args[0], args[1] if len(args) == 2 else None
+    if not isinstance(path, JlString):
+        raise JlTypeError("first argument must be a string")
+    if mode is None:
+        mode = "r"
+    elif not isinstance(mode, JlString) or mode.value not in ("r", "w", "a"):
+        raise JlTypeError("second argument must be \"r\", \"w\" or \"a\"")
+    else:
+        mode = mode.value
+    with io_errors():
+        return JlFile(open(path.value, mode, buffering=block_size, encoding="utf-8"))
+
+
+def jl_read_line(f):
+    check_file(f)
+    with io_errors():
+        line = f.read_line()
+    return unit if line is None else line
+
+
+def jl_lines(f):
+    check_file(f)
+    return JlLines(f)
+
+
+def jl_next(lines):
+    if not isinstance(lines, JlLines):
+        raise JlTypeError("first argument must be the lines of a file")
+    with io_errors():
+        line = lines.value.read_line()
+    return unit if line is None else line
+
+
+def jl_write(*args):
+    # like print with several arguments, since strings can't contain line breaks
+    if len(args) == 0:
+        raise JlTypeError("write takes a file and the values to write")
+    f, values = args[0], args[1:]
+    check_file(f)
+    with io_errors():
+        print(*map(str, values), file=f.value)
+
+
+def jl_flush(f):
+    check_file(f)
+    with io_errors():
+        f.value.flush()
+
+
+def jl_close(f):
+    check_file(f)
+    with io_errors():
+        f.value.close()
+
+
+def jl_mmap_open(*args):
+    if len(args) not in (1, 2):
+        raise JlTypeError("mmap_open takes a path and optionally \"lines\" or \"bytes\"")
+    path = args[0]
+    if not isinstance(path, JlString):
+        raise JlTypeError("first argument must be a string")
+    by_lines = True
+    if len(args) == 2:
+        if not isinstance(args[1], JlString) or args[1].value not in ("lines", "bytes"):
+            raise JlTypeError("second argument must be \"lines\" or \"bytes\"")
+        by_lines = args[1].value == "lines"
+    with io_errors():
+        with open(path.value, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # empty files can't be mapped
+                data = b""
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return JlMapped(data, path.value, by_lines)
+
+
+def jl_range(*args):
+    if len(args) not in (1, 2):
+        raise JlTypeError("range takes an end or a start and an end")
+    for arg in args:
+        if not isinstance(arg, JlNumber):
+            raise JlTypeError("arguments must be numbers")
+    bounds = [int(arg.value) for arg in args]
+    return JlList([JlNumber(i) for i in range(*bounds)])
+
+
+def jl_sort(list):
+    if not isinstance(list, JlList):
+        raise JlTypeError("first argument must be a list")
+    if len(list.value) == 0:
+        return JlList([])
+    types = [t for t, count in list.types.items() if count > 0]
+    if len(types) != 1 or types[0] not in (JlNumber, JlString):
+        raise JlTypeError("only lists of numbers or of strings can be sorted")
+    return JlList(sorted(list.value, key=lambda v: v.value))
+
+
+def jl_zeros(n):
+    if not isinstance(n, JlNumber):
+        raise JlTypeError("first argument must be a number")
+    return JlArray(array('d', bytes(8 * max(int(n.value), 0))),
+                   JlComment(f"an array of {n} zeros"))
+
+
+def jl_array(list):
+    if not isinstance(list, JlList):
+        raise JlTypeError("first argument must be a list")
+    if list.types[JlNumber] != len(list.value):
+        raise JlTypeError("only lists of numbers can be turned into arrays")
+    return JlArray(array('d', [v.value for v in list.value]),
+                   derived_comment("as_array", list))
+
+
+def jl_arange(*args):
+    if len(args) not in (1, 2):
+        raise JlTypeError("arange takes an end or a start and an end")
+    for arg in args:
+        if not isinstance(arg, JlNumber):
+            raise JlTypeError("arguments must be numbers")
+    bounds = [int(arg.value) for arg in args]
+    return JlArray(array('d', range(*bounds)))
+
+
+def reduce_array(a, reduce, name):
+    if not isinstance(a, JlArray):
+        raise JlTypeError("first argument must be an array")
+    if len(a.value) == 0:
+        raise JlTypeError("the array is empty")
+    return JlNumber(reduce(a.value), derived_comment(name, a))
+
+
+def jl_sum(a):
+    return reduce_array(a, fsum, "total")
+
+
+def jl_min(a):
+    return reduce_array(a, min, "minimum")
+
+
+def jl_max(a):
+    return reduce_array(a, max, "maximum")
+
+
+def jl_dot(a, b):
+    if not isinstance(a, JlArray):
+        raise JlTypeError("first argument must be an array")
+    if not isinstance(b, JlArray):
+        raise JlTypeError("second argument must be an array")
+    if len(a.value) != len(b.value):
+        raise JlTypeError("the arrays must have the same length")
+    return JlNumber(fsum(map(operator.mul, a.value, b.value)),
+                    derived_comment("dot", a, b))
 
 
 def jl_randint(min, max):
@@ -82,11 +445,10 @@ def jl_randint(min, max):
     if not isinstance(max, JlNumber):
         raise JlTypeError("second argument must be a number")
     return JlNumber(randint(min.value, max.value),
-                    JlComment(f"a random integer between {min} and {max}"))
+                    derived_comment("random", str(min), str(max)))
 
 
-prelude = Environment()
-prelude.bindings = {
+prelude = Environment.with_bindings({
     "print": JlPrimitive(jl_print, None, JlComment("the builtin print function")),
     "input": JlPrimitive(jl_input, 0, JlComment("the builtin input function")),
     "str": JlPrimitive(jl_str, 1, JlComment("the builtin str function")),
@@ -98,4 +460,34 @@ prelude.bindings = {
     "get": JlPrimitive(jl_get, 2, JlComment("the builtin get function")),
     "len": JlPrimitive(jl_len, 1, JlComment("the builtin len function")),
     "randint": JlPrimitive(jl_randint, 2, JlComment("the builtin randint function")),
-}
+    "slice": JlPrimitive(jl_slice, 3, JlComment("the builtin slice function")),
+    "extend": JlPrimitive(jl_extend, 2, JlComment("the builtin extend function")),
+    "map": JlPrimitive(jl_map, 2, JlComment("the builtin map function"), calls_functions=True),
+    "filter": JlPrimitive(jl_filter, 2, JlComment("the builtin filter function"), calls_functions=True),
+    "fold": JlPrimitive(jl_fold, 3, JlComment("the builtin fold function"), calls_functions=True),
+    "memo": JlPrimitive(jl_memo, None, JlComment("the builtin memo function")),
+    "memo_stats": JlPrimitive(jl_memo_stats, 1, JlComment("the builtin memo_stats function")),
+    "dict": JlPrimitive(jl_dict, None, JlComment("the builtin dict function")),
+    "dget": JlPrimitive(jl_dget, 2, JlComment("the builtin dget function")),
+    "dput": JlPrimitive(jl_dput, 3, JlComment("the builtin dput function")),
+    "has": JlPrimitive(jl_has, 2, JlComment("the builtin has function")),
+    "keys": JlPrimitive(jl_keys, 1, JlComment("the builtin keys function")),
+    "del": JlPrimitive(jl_del, 2, JlComment("the builtin del function")),
+    "open": JlPrimitive(jl_open, None, JlComment("the builtin open function")),
+    "read_line": JlPrimitive(jl_read_line, 1, JlComment("the builtin read_line function")),
+    "lines": JlPrimitive(jl_lines, 1, JlComment("the builtin lines function")),
+    "next": JlPrimitive(jl_next, 1, JlComment("the builtin next function")),
+    "write": JlPrimitive(jl_write, None, JlComment("the builtin write function")),
+    "flush": JlPrimitive(jl_flush, 1, JlComment("the builtin flush function")),
+    "close": JlPrimitive(jl_close, 1, JlComment("the builtin close function")),
+    "mmap_open": JlPrimitive(jl_mmap_open, None, JlComment("the builtin mmap_open function")),
+    "range": JlPrimitive(jl_range, None, JlComment("the builtin range function")),
+    "sort": JlPrimitive(jl_sort, 1, JlComment("the builtin sort function")),
+    "zeros": JlPrimitive(jl_zeros, 1, JlComment("the builtin zeros function")),
+    "array": JlPrimitive(jl_array, 1, JlComment("the builtin array function")),
+    "arange": JlPrimitive(jl_arange, None, JlComment("the builtin arange function")),
+    "sum": JlPrimitive(jl_sum, 1, JlComment("the builtin sum function")),
+    "min": JlPrimitive(jl_min, 1, JlComment("the builtin min function")),
+    "max": JlPrimitive(jl_max, 1, JlComment("the builtin max function")),
+    "dot": JlPrimitive(jl_dot, 2, JlComment("the builtin dot function")),
+})
@@ -0,0 +1,164 @@
+import time
+from jlast import FnExpr
+from jltypes import JlClosure
+from prelude import prelude
+
+
+class CallNode:
+    """The calls of one function from the same chain of callers."""
+    __slots__ = ("key", "children", "calls", "self_time")
+
+    def __init__(self, key):
+        self.key = key
+        self.children = {}
+        self.calls = 0
+        self.self_time = 0.0
+
+
+class Profiler:
+    """Records the time spent in every function of a PlsExplain program.
+
+    The engines call `enter` whenever a function is called from a call site
+    (the same locations that are pushed on the backtrace) and `leave` when
+    it returns. Time is attributed to the innermost running function, which
+    builds a tree of calls. From that tree `report` sums up the time and
+    calls of every function and call site, and `collapsed_stacks` writes
+    the input of flamegraph.pl."""
+
+    def __init__(self, name="<program>"):
+        self.root = CallNode(name)
+        self.root.calls = 1
+        # (node, call site, time of the call) of every running call
+        self.stack = [(self.root, None, 0.0)]
+        # id of the call site -> [location, calls, time]
+        self.sites = {}
+        self.running_sites = {}
+        # the builtins don't know their own names
+        self.builtin_names = {id(v): k for k, v in prelude.bindings.items()}
+        self.last = time.perf_counter()
+
+    def start(self):
+        # everything before doesn't count towards the time of the program
+        self.last = time.perf_counter()
+
+    def key(self, f):
+        # all closures created from the same fn expression are one function
+        if type(f) is JlClosure and f.definition is not None:
+            return f.definition
+        return f
+
+    def enter(self, f, location):
+        now = time.perf_counter()
+        node = self.stack[-1][0]
+        node.self_time += now - self.last
+        self.last = now
+
+        key = self.key(f)
+        child = node.children.get(id(key))
+        if child is None:
+            child = node.children[id(key)] = CallNode(key)
+        child.calls += 1
+
+        site = self.sites.get(id(location))
+        if site is None:
+            site = self.sites[id(location)] = [location, 0, 0.0]
+        site[1] += 1
+        self.running_sites[id(location)] = self.running_sites.get(id(location), 0) + 1
+        self.stack.append((child, location, now))
+
+    def leave(self):
+        now = time.perf_counter()
+        node, location, start = self.stack.pop()
+        node.self_time += now - self.last
+        self.last = now
+
+        # only the outermost of recursive calls from the same site counts
+        running = self.running_sites[id(location)] - 1
+        self.running_sites[id(location)] = running
+        if running == 0:
+            self.sites[id(location)][2] += now - start
+
+    def stop(self):
+        # the calls that are still running when the program failed
+        while len(self.stack) > 1:
+            self.leave()
+        now = time.perf_counter()
+        self.root.self_time += now - self.last
+        self.last = now
+
+    def label(self, key):
+        if key is self.root.key:
+            return key
+        if isinstance(key, FnExpr):
+            loc = key.location
+            return f"{key.name or 'fn'} ({loc.filename}:{loc.line})"
+        name = self.builtin_names.get(id(key))
+        if name is not None:
+            return f"{name} (builtin)"
+        return repr(key)
+
+    def traverse(self):
+        # yields (True, node) before and (False, node) after the children of
+        # every node, without recursing in python
+        stack = [(self.root, True)]
+        while stack:
+            node, entering = stack.pop()
+            yield entering, node
+            if entering:
+                stack.append((node, False))
+                stack.extend((child, True) for child in node.children.values())
+
+    def function_stats(self):
+        # id of the function -> [function, calls, total time, self time]
+        stats = {}
+        running = {}
+        inclusive = []
+        for entering, node in self.traverse():
+            k = id(node.key)
+            if entering:
+                entry = stats.setdefault(k, [node.key, 0, 0.0, 0.0])
+                entry[1] += node.calls
+                entry[3] += node.self_time
+                running[k] = running.get(k, 0) + 1
+                inclusive.append(node.self_time)
+            else:
+                elapsed = inclusive.pop()
+                if inclusive:
+                    inclusive[-1] += elapsed
+                # recursive calls are already part of the outermost call
+                running[k] -= 1
+                if running[k] == 0:
+                    stats[k][2] += elapsed
+        return stats.values()
+
+    def report(self, source=None):
+        stats = sorted(self.function_stats(), key=lambda s: s[3], reverse=True)
+        total = sum(s[3] for s in stats)
+        lines = [f"total time: {total:.3f}s", "",
+                 f"{'calls':>10} {'total s':>10} {'self s':>10} {'self %':>7}  function"]
+        for key, calls, total_time, self_time in stats:
+            percent = 100 * self_time / total if total else 0
+            lines.append(f"{calls:>10} {total_time:>10.3f} {self_time:>10.3f} {percent:>6.1f}%  {self.label(key)}")
+
+        lines += ["", f"{'calls':>10} {'total s':>10}  call site"]
+        source_lines = source.split('\n') if source is not None else None
+        for location, calls, total_time in sorted(self.sites.values(), key=lambda s: s[2], reverse=True):
+            line = f"{calls:>10} {total_time:>10.3f}  {location.filename}:{location.line}:{location.column}"
+            if source_lines is not None and location.line == location.end_line:
+                line += "  " + source_lines[location.line - 1][location.column - 1:location.end_column - 1]
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    def collapsed_stacks(self):
+        # one line per chain of calls with its self time in microseconds
+        lines = []
+        frames = []
+        for entering, node in self.traverse():
+            if not entering:
+                frames.pop()
+                continue
+            frames.append(self.label(node.key).replace(";", ":"))
+            micros = round(node.self_time * 1e6)
+            if micros > 0:
+                lines.append(f"{';'.join(frames)} {micros}")
+        return "\n".join(lines) + "\n"
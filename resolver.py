@@ -1,35 +1,174 @@
 from exceptions import UnboundVariable;
-from jlast import AstVisitor
+from jlast import AstVisitor, Block, CallExpr, IfExpr, Name
 from prelude import prelude
 
 
+def mark_tail_calls(expr):
+    # calls whose value is returned by the function without being used
+    if isinstance(expr, CallExpr):
+        expr.tail = True
+    elif isinstance(expr, Block) and len(expr.exprs) > 0:
+        mark_tail_calls(expr.exprs[-1])
+    elif isinstance(expr, IfExpr):
+        mark_tail_calls(expr.then_body)
+        if expr.else_body is not None:
+            mark_tail_calls(expr.else_body)
+
+
+class GlobalScope:
+    """The names of a global frame.
+
+    The names the program being resolved declares are kept apart until it
+    has been resolved completely, so a program that fails to resolve
+    doesn't declare anything, without copying the names of the frame."""
+
+    def __init__(self, names):
+        self.names = names
+        self.new = {}
+
+    def __contains__(self, name):
+        return name in self.new or name in self.names
+
+    def __getitem__(self, name):
+        if name in self.new:
+            return self.new[name]
+        return self.names[name]
+
+    def __len__(self):
+        return len(self.names) + len(self.new)
+
+    def setdefault(self, name, slot):
+        if name in self.names:
+            return self.names[name]
+        return self.new.setdefault(name, slot)
+
+    def commit(self):
+        self.names.update(self.new)
+        self.new = {}
+        return self.names
+
+
+class FunctionScope:
+    """The free variables of a function that is being resolved."""
+
+    def __init__(self, first_scope):
+        # the index of the scope of the parameters
+        self.first_scope = first_scope
+        # name -> index in captures
+        self.free = {}
+        self.captures = []
+        # the names bound to the cells, whose slots are only known once
+        # the size of the frame is
+        self.references = []
+
+
 class Resolver(AstVisitor):
+    """Assigns every name the frame and slot of the variable it refers to.
+
+    The variables of enclosing scopes a function uses are its free
+    variables. They are captured when the closure is created, as Cells that
+    are shared with the scope declaring them, so closures don't keep the
+    frames of enclosing scopes alive. Variables of the global scopes are
+    never captured, the global frames live as long as the program."""
+
     def __init__(self, env=None):
         super().__init__()
+        # every scope maps the names declared in it to their slot in the frame
         self.scopes = []
+        self.environment = env
         if env is None:
-            self.scopes.append(set(prelude.bindings.keys()))
-            self.scopes.append(set())
+            self.scopes.append(GlobalScope(dict(prelude.names)))
+            self.scopes.append(GlobalScope({}))
         else:
             while env is not None:
-                self.scopes.insert(0, set(env.bindings.keys()))
+                self.scopes.insert(0, GlobalScope(env.names))
                 env = env.parent
+        self.globals = len(self.scopes)
+        # for every scope, name -> the names bound to the variable, and the
+        # names of the variables closures capture
+        self.references = [{} for _ in self.scopes]
+        self.captured = [set() for _ in self.scopes]
+        self.functions = []
 
     def begin_scope(self):
-        self.scopes.append(set())
+        self.scopes.append({})
+        self.references.append({})
+        self.captured.append(set())
 
     def end_scope(self):
-        self.scopes.pop(-1)
+        # the size of the frame and the slots that hold cells
+        scope = self.scopes.pop(-1)
+        self.references.pop(-1)
+        captured = self.captured.pop(-1)
+        return len(scope), sorted(scope[name] for name in captured)
+
+    def declare(self, name):
+        scope = self.scopes[-1]
+        name.slot = scope.setdefault(name.name, len(scope))
+
+    def capture(self, index, name):
+        self.captured[index].add(name)
+        for n in self.references[index].get(name, ()):
+            n.cell = True
+
+    def bind(self, n, top, level):
+        # binds n as seen from the scope `top` in the function
+        # self.functions[level], or outside of functions if level is -1.
+        # returns the index of the scope declaring the variable, or None if
+        # it's a free variable of the function
+        first = self.functions[level].first_scope if level >= 0 else 0
+        for i in range(top, first - 1, -1):
+            scope = self.scopes[i]
+            if n.name in scope:
+                n.binding_depth = top - i
+                n.slot = scope[n.name]
+                if i >= self.globals:
+                    self.references[i].setdefault(n.name, []).append(n)
+                    n.cell = n.name in self.captured[i]
+                return i
+
+        declared = next((i for i in range(first - 1, -1, -1) if n.name in self.scopes[i]), None)
+        if declared is None:
+            raise UnboundVariable(n)
+        if declared < self.globals:
+            # the parent of the frame of the function is the global frame
+            n.binding_depth = top - first + self.globals - declared
+            n.slot = self.scopes[declared][n.name]
+            return declared
+
+        function = self.functions[level]
+        if n.name not in function.free:
+            captured = Name(n.location, n.name)
+            index = self.bind(captured, first - 1, level - 1)
+            if index is not None:
+                self.capture(index, n.name)
+            function.free[n.name] = len(function.captures)
+            function.captures.append(captured)
+        n.binding_depth = top - first
+        n.slot = function.free[n.name]
+        n.cell = True
+        function.references.append(n)
+        return None
+
+    def global_depth(self):
+        # the number of frames from the innermost scope to the global frame
+        top = len(self.scopes) - 1
+        if self.functions:
+            return top - self.functions[-1].first_scope + 1
+        return top - self.globals + 1
 
     def visit_program(self, b):
         for stmt in b.exprs:
             self.visit(stmt)
+        # only grow the global frame once the whole program has been resolved
+        if self.environment is not None:
+            self.environment.set_names(self.scopes[-1].commit())
         
     def visit_block(self, b):
         self.begin_scope()
         for stmt in b.exprs:
             self.visit(stmt)
-        self.end_scope()
+        b.frame_size, b.cell_slots = self.end_scope()
 
     def visit_commented_expr(self, e):
         self.visit(e.expr)
@@ -40,7 +179,7 @@ class Resolver(AstVisitor):
         self.visit(a.expr)
         
     def visit_declaration(self, a):
-        self.scopes[-1].add(a.name.name)
+        self.declare(a.name)
         self.visit(a.name)
         self.visit(a.expr)
 
@@ -48,11 +187,7 @@ class Resolver(AstVisitor):
         pass
 
     def visit_name(self, n):
-        for i in range(len(self.scopes)):
-            if n.name in self.scopes[-i - 1]:
-                n.binding_depth = i
-                return
-        raise UnboundVariable(n)
+        self.bind(n, len(self.scopes) - 1, len(self.functions) - 1)
 
     def visit_bin_expr(self, e):
         self.visit(e.lhs)
@@ -75,11 +210,22 @@ class Resolver(AstVisitor):
             self.visit(a)
         
     def visit_fn_expr(self, f):
+        f.global_depth = self.global_depth()
+        function = FunctionScope(len(self.scopes))
+        self.functions.append(function)
         self.begin_scope()
         for p in f.params:
-            self.scopes[-1].add(p.name)
+            self.declare(p)
+            self.visit(p)
         self.visit(f.body)
-        self.end_scope()
+        size, f.cell_slots = self.end_scope()
+        self.functions.pop(-1)
+        # the cells go behind the variables of the function
+        for n in function.references:
+            n.slot += size
+        f.frame_size = size + len(function.captures)
+        f.captures = function.captures
+        mark_tail_calls(f.body)
                 
     def visit_explain_expr(self, c):
         self.visit(c.expr)
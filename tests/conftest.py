@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the interpreter's modules are imported from the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,46 @@
+import gc
+import weakref
+
+import pytest
+
+import api
+from jltypes import JlList, JlNumber, JlPrimitive
+from pls_explain import engines
+
+
+class TrackedList(JlList):
+    __slots__ = ("__weakref__",)
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_builtins_can_be_assigned(engine):
+    program = api.compile("print = fn(x) { x }; print(1)", engine=engine)
+    result = program.run()
+    assert result.error is None
+    assert api.to_python(result.value) == 1
+    assert result.output == ""
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_assigned_builtins_are_not_shared(engine):
+    api.compile("print = fn(x) { x }; print(1)", engine=engine).run()
+    result = api.compile('print("ok", 1)', engine=engine).run()
+    assert result.output == "ok 1\n"
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_runs_dont_keep_each_other_alive(engine):
+    # the program is run again, so its compiled form must not hold on to the
+    # values of the first run
+    lists = []
+
+    def make():
+        lists.append(TrackedList([JlNumber(i) for i in range(10)]))
+        return lists[-1]
+
+    program = api.compile('let g = { let big = make(); fn() { len(big) } }; g()',
+                          globals=["make"], engine=engine)
+    assert program.run(globals={"make": JlPrimitive(make, 0)}).error is None
+    ref = weakref.ref(lists.pop())
+    gc.collect()
+    assert ref() is None
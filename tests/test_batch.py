@@ -0,0 +1,50 @@
+import io
+import json
+
+import batch
+
+
+def run_batch(tmp_path, programs):
+    for name, source in programs.items():
+        (tmp_path / name).write_bytes(source)
+    out = io.StringIO()
+    failed = batch.run_batch(str(tmp_path), jobs=1, out=out)
+    entries = {entry["file"][len(str(tmp_path)) + 1:]: entry
+               for entry in map(json.loads, out.getvalue().splitlines())}
+    return failed, entries
+
+
+def test_failing_programs(tmp_path):
+    failed, entries = run_batch(tmp_path, {
+        "good.pe": b'print("ok", 1); 1 + 2',
+        "type.pe": b'print("before", 1);\n1 + "x"',
+        "syntax.pe": b'let = ;',
+        "unbound.pe": b'print(x)',
+        "binary.pe": b'\xff\xfe',
+    })
+    assert failed == 4
+    assert entries["good.pe"]["ok"]
+    assert entries["good.pe"]["value"] == "3"
+    assert entries["good.pe"]["output"] == "ok 1\n"
+
+    error = entries["type.pe"]["error"]
+    assert not entries["type.pe"]["ok"]
+    assert error["kind"] == "JlTypeError"
+    assert error["line"] == 2
+    # what was printed before the error is kept
+    assert entries["type.pe"]["output"] == "before 1\n"
+    assert "value" not in entries["type.pe"]
+
+    assert entries["syntax.pe"]["error"]["kind"] == "SyntaxError"
+    assert entries["unbound.pe"]["error"]["kind"] == "UnboundVariable"
+    assert entries["binary.pe"]["error"]["kind"] == "UnicodeDecodeError"
+
+
+def test_recursion_fails_only_its_program(tmp_path):
+    failed, entries = run_batch(tmp_path, {
+        "deep.pe": b'let f = fn(n) { 1 + f(n + 1) }; f(0)',
+        "good.pe": b'1',
+    })
+    assert failed == 1
+    assert entries["deep.pe"]["error"]["kind"] == "RecursionDepthExceeded"
+    assert entries["good.pe"]["ok"]
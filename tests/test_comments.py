@@ -0,0 +1,32 @@
+import contextlib
+import io
+
+import pytest
+
+import batch
+import jltypes
+from engines import engines
+from pls_explain import eval_source
+
+
+@pytest.mark.parametrize("source", ["1 + 2", "1 + \"x\""])
+def test_eval_source_restores_comment_mode(source):
+    with contextlib.redirect_stdout(io.StringIO()):
+        eval_source("<test>", engines["tree"](), source, debug=False, comments="none")
+    assert jltypes.comment_mode == "full"
+
+
+@pytest.mark.parametrize("mode", ["full", "summary", "none"])
+def test_batch_has_no_default_comment(tmp_path, mode):
+    path = tmp_path / "sum.pe"
+    path.write_text("1 + 2")
+    entry = batch.run_program(str(path), "tree", True, None, mode)
+    assert entry["value"] == "3"
+    assert ("comment" in entry) == (mode != "none")
+
+
+def test_batch_keeps_comment_asked_for(tmp_path):
+    path = tmp_path / "sum.pe"
+    path.write_text('print(1 + 2); 1 + 2')
+    entry = batch.run_program(str(path), "tree", True, None, "none")
+    assert "comment" in entry
@@ -0,0 +1,32 @@
+import contextlib
+import io
+
+from pls_explain import engines, eval_source
+
+
+def run(source, engine="tree"):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        eval_source("<test>", engines[engine](), source, debug=False)
+    return out.getvalue()
+
+
+def test_keys_of_different_types_are_distinct():
+    output = run('let d = dict(1, "number", "1", "string", True, "bool", (), "unit"); '
+                 'print(len(d), dget(d, 1), dget(d, "1"), dget(d, True), dget(d, ()))')
+    assert output == "4 number string bool unit\n"
+
+
+def test_equal_numbers_are_the_same_key():
+    output = run('let d = dict(1, "a"); dput(d, 1.0, "b"); print(len(d), dget(d, 1))')
+    assert output == "1 b\n"
+
+
+def test_false_and_zero_are_distinct():
+    output = run('let d = dict(0, "zero"); print(has(d, False), dget(d, False))')
+    assert output == "False ()\n"
+
+
+def test_lists_are_not_keys():
+    output = run('dict(list(1), 2)')
+    assert output.endswith("keys must be numbers, strings, booleans or ()\n")
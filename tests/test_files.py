@@ -0,0 +1,46 @@
+import contextlib
+import io
+
+from pls_explain import engines, eval_source
+
+
+def run(source, engine="tree"):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        eval_source("<test>", engines[engine](), source, debug=False)
+    return out.getvalue()
+
+
+def test_read_line_at_end_of_file(tmp_path):
+    path = tmp_path / "two.txt"
+    path.write_text("first\nsecond")
+    output = run(f'let f = open("{path}"); '
+                 'print("ok", read_line(f), read_line(f), read_line(f), read_line(f))')
+    assert output == "ok first second () ()\n"
+
+
+def test_next_at_end_of_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    output = run(f'let it = lines(open("{path}")); print("ok", next(it), next(it))')
+    assert output == "ok () ()\n"
+
+
+def test_written_lines_are_read_back(tmp_path):
+    path = tmp_path / "out.txt"
+    output = run(f'let f = open("{path}", "w"); write(f, "a", 1); close(f); '
+                 f'print("ok", read_line(open("{path}")))')
+    assert output == "ok a 1\n"
+
+
+def test_missing_file_is_an_io_error(tmp_path):
+    output = run(f'open("{tmp_path / "missing.txt"}")')
+    assert "io error: " in output
+    assert output.endswith("No such file or directory: '" + str(tmp_path / "missing.txt") + "'\n")
+
+
+def test_closed_file_is_an_io_error(tmp_path):
+    path = tmp_path / "one.txt"
+    path.write_text("line\n")
+    output = run(f'let f = open("{path}"); close(f); read_line(f)')
+    assert "io error: " in output
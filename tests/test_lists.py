@@ -0,0 +1,33 @@
+import contextlib
+import io
+
+import pytest
+
+from jltypes import JlNumber, JlUnit
+from pls_explain import engines, eval_source
+
+
+def run(source, engine="tree"):
+    # returns the value of the program and what it printed
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        value = eval_source("<test>", engines[engine](), source, debug=False)
+    return value, out.getvalue()
+
+
+def test_extend_with_itself_counts_types_once():
+    value, _ = run('let l = list(1, 2); extend(l, l); l')
+    assert value.types[JlNumber] == 4
+
+
+@pytest.mark.parametrize("make", ["list(1, 2)", "arange(2)"])
+@pytest.mark.parametrize("call", ["get(l, -1)", "put(l, -1, 5)", "get(l, -5)", "put(l, -5, 5)"])
+def test_negative_index_is_an_error(make, call):
+    _, output = run(f"let l = {make}; {call}")
+    assert output.endswith("second argument must not be negative\n")
+
+
+@pytest.mark.parametrize("make", ["list(1, 2)", "arange(2)"])
+def test_index_past_the_end(make):
+    value, _ = run(f"let l = {make}; put(l, 2, 5); get(l, 2)")
+    assert isinstance(value, JlUnit)
@@ -0,0 +1,63 @@
+import contextlib
+import io
+
+import pytest
+
+from pls_explain import engines, eval_source
+
+
+def run(source, engine="tree"):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        eval_source("<test>", engines[engine](), source, debug=False)
+    return out.getvalue()
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("a\nbb\nccc\n")
+    return path
+
+
+@pytest.mark.parametrize("call, result", [
+    ("len(m)", "3"),
+    ("get(m, 0)", "a"),
+    ("get(m, -1)", "ccc"),
+    ("get(m, -3)", "a"),
+    ("get(m, 3)", "()"),
+    ("get(m, -4)", "()"),
+    ("slice(m, 1, 3)", "[bb, ccc]"),
+    ("slice(m, -2, 10)", "[bb, ccc]"),
+    ("slice(m, 5, 9)", "[]"),
+])
+def test_lines(path, call, result):
+    assert run(f'let m = mmap_open("{path}"); print("ok", {call})') == f"ok {result}\n"
+
+
+@pytest.mark.parametrize("call, result", [
+    ("len(m)", "9"),
+    ("get(m, 0)", "97"),
+    ("get(m, -1)", "10"),
+    ("get(m, 9)", "()"),
+    ("get(m, -10)", "()"),
+    ("slice(m, 2, 4)", "bb"),
+    ("slice(m, -4, -1)", "ccc"),
+    ("slice(m, 9, 50)", ""),
+])
+def test_bytes(path, call, result):
+    assert run(f'let m = mmap_open("{path}", "bytes"); print("ok", {call})') == f"ok {result}\n"
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    output = run(f'let m = mmap_open("{path}"); print("ok", len(m), get(m, 0), get(m, -1))')
+    assert output == "ok 0 () ()\n"
+
+
+def test_last_line_without_line_break(tmp_path):
+    path = tmp_path / "open.txt"
+    path.write_text("a\nbb")
+    output = run(f'let m = mmap_open("{path}"); print("ok", len(m), get(m, 1))')
+    assert output == "ok 2 bb\n"
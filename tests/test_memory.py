@@ -0,0 +1,72 @@
+import contextlib
+import gc
+import io
+import sys
+import weakref
+
+import pytest
+
+from jltypes import JlBool, JlList, JlNumber, JlPrimitive
+from pls_explain import engines, eval_source
+
+
+class TrackedList(JlList):
+    __slots__ = ("__weakref__",)
+
+
+def run(source, engine):
+    # the program gets a big list from make and can ask with freed if it has
+    # been freed. returns the global variables, the result and a weak
+    # reference to the list
+    lists = []
+
+    def make():
+        lists.append(TrackedList([JlNumber(i) for i in range(10000)]))
+        return lists[-1]
+
+    def freed():
+        gc.collect()
+        return JlBool(sys.getrefcount(lists[-1]) == 2)
+
+    interpreter = engines[engine]()
+    interpreter.environment.define("make", JlPrimitive(make, 0))
+    interpreter.environment.define("freed", JlPrimitive(freed, 0))
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        value = eval_source("<test>", interpreter, source, debug=False)
+    assert value is not None, out.getvalue()
+    ref = weakref.ref(lists.pop())
+    gc.collect()
+    return interpreter.environment.bindings, value, ref
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_block_scope_is_freed(engine):
+    bindings, _, ref = run('let g = { let big = make(); fn() { 1 } }; g()', engine)
+    assert "g" in bindings
+    assert ref() is None
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_function_scope_is_freed(engine):
+    bindings, _, ref = run('let f = fn() { let big = make(); let n = 1; fn() { n } }; let g = f(); g()',
+                           engine)
+    assert "g" in bindings
+    assert ref() is None
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_captured_list_is_kept(engine):
+    _, value, ref = run('let f = fn() { let big = make(); fn() { len(big) } }; let g = f(); g()',
+                        engine)
+    assert value.value == 10000
+    assert ref() is not None
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_call_sites_dont_keep_callees_alive(engine):
+    # the call site of g remembers what it called, which must not keep g and
+    # the list it captures alive once f has returned
+    _, value, _ = run('let f = fn() { let big = make(); let g = fn() { len(big) }; g() }; f(); freed()',
+                      engine)
+    assert value.value is True
@@ -0,0 +1,37 @@
+import contextlib
+import glob
+import io
+import os
+import random
+import sys
+
+import pytest
+
+from pls_explain import engines, eval_source
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+examples = sorted(glob.glob(os.path.join(root, 'examples', '**', '*.pe'), recursive=True))
+# enough input for every example that reads some, like tictactoe
+stdin = "hello\n42\n" + "".join(f"{i}\n" for i in range(1, 10)) * 3
+
+
+def run(path, engine, optimize):
+    with open(path) as f:
+        source = f.read()
+    # tictactoe plays random moves
+    random.seed(0)
+    out = io.StringIO()
+    saved_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    try:
+        with contextlib.redirect_stdout(out):
+            value = eval_source(path, engines[engine](), source, debug=False, optimize=optimize)
+    finally:
+        sys.stdin = saved_stdin
+    return out.getvalue(), str(value), str(value.get_comment())
+
+
+@pytest.mark.parametrize("engine", list(engines))
+@pytest.mark.parametrize("path", examples, ids=lambda p: os.path.relpath(p, root))
+def test_folding_keeps_values_and_comments(path, engine):
+    assert run(path, engine, True) == run(path, engine, False)
@@ -0,0 +1,51 @@
+import contextlib
+import io
+
+import pytest
+
+from pls_explain import engines, eval_source
+from profiler import Profiler
+
+
+def profile(source, engine):
+    interpreter = engines[engine]()
+    interpreter.profiler = Profiler()
+    with contextlib.redirect_stdout(io.StringIO()):
+        eval_source("<test>", interpreter, source, debug=False)
+    profiler = interpreter.profiler
+    # every call has ended
+    assert len(profiler.stack) == 1
+    profiler.stop()
+    stats = {profiler.label(key).split(" ")[0]: (calls, total, self_time)
+             for key, calls, total, self_time in profiler.function_stats()}
+    return profiler, stats
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_tail_calls(engine):
+    profiler, stats = profile("let loop = fn(n) { if (n == 0) 0 else loop(n - 1) }; loop(1000)", engine)
+    calls, total, self_time = stats["loop"]
+    assert calls == 1001
+    # the calls follow each other, so their time is counted once
+    program_time = sum(s[2] for s in stats.values())
+    assert self_time <= total <= program_time
+    sites = sorted(site[1] for site in profiler.sites.values())
+    assert sites == [1, 1000]
+    assert all(site[2] <= program_time for site in profiler.sites.values())
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_mutual_tail_calls(engine):
+    _, stats = profile("let odd = (); let even = fn(n) { if (n == 0) True else odd(n - 1) }; "
+                       "odd = fn(n) { if (n == 0) False else even(n - 1) }; even(1000)", engine)
+    assert stats["even"][0] == 501
+    # odd is assigned, so its function has no name
+    assert stats["fn"][0] == 500
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_functions_called_by_builtins(engine):
+    _, stats = profile("let inc = fn(x) { x + 1 }; map(list(1, 2, 3), inc)", engine)
+    assert stats["map"][0] == 1
+    assert stats["inc"][0] == 3
+    assert stats["inc"][1] <= stats["map"][1]
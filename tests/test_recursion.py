@@ -0,0 +1,52 @@
+import contextlib
+import io
+
+import pytest
+
+from pls_explain import engines, eval_source
+
+countdown = "let f = fn(n) { if (n == 0) 0 else 1 + f(n - 1) }; print(f(N))"
+
+
+def run(source, engine, max_depth=None):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        eval_source("<test>", engines[engine](max_depth), source, debug=False)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_default_max_depth_fits(engine):
+    assert run(countdown.replace("N", "990"), engine).startswith("990 ")
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_max_depth_is_exceeded(engine):
+    output = run(countdown.replace("N", "1100"), engine, 1000)
+    assert output.endswith("maximum recursion depth exceded\n")
+
+
+@pytest.mark.parametrize("engine", ["tree", "closure"])
+def test_python_stack_ends_like_max_depth(engine):
+    # far more calls than fit on the python stack
+    output = run(countdown.replace("N", "100000"), engine, 1000000)
+    assert output.endswith("maximum recursion depth exceded\n")
+
+
+
+# print with one argument prints the comment, which grows exponentially for fib
+memo_fib = 'let fib = memo(fn(n) { if (n < 2) n else fib(n - 1) + fib(n - 2) }); print("ok", fib(N) > 0)'
+mapped = 'let f = fn(n) { if (n == 0) 0 else 1 + get(map(list(n - 1), f), 0) }; print("ok", f(N))'
+
+
+@pytest.mark.parametrize("source", [memo_fib, mapped])
+def test_vm_runs_callbacks_on_frame_stack(source):
+    # deeper than the python stack allows
+    assert run(source.replace("N", "20000"), "vm").startswith(("ok True", "ok 20000"))
+
+
+@pytest.mark.parametrize("engine", ["tree", "closure"])
+@pytest.mark.parametrize("source", [memo_fib, mapped])
+def test_callbacks_end_like_max_depth(engine, source):
+    output = run(source.replace("N", "100000"), engine, 1000000)
+    assert output.endswith("maximum recursion depth exceded\n")
@@ -0,0 +1,28 @@
+from jltypes import JlString, StringNode
+
+# far more concatenations than python's recursion limit
+depth = 20000
+part = "x" * JlString.min_lazy_length
+
+
+def test_flatten_left_nested():
+    s = JlString(part)
+    for i in range(depth):
+        s = s + JlString(str(i % 10))
+    assert isinstance(s._value, StringNode)
+    assert s.value == part + "".join(str(i % 10) for i in range(depth))
+
+
+def test_flatten_right_nested():
+    s = JlString(part)
+    for i in range(depth):
+        s = JlString(str(i % 10)) + s
+    assert s.value == "".join(str(i % 10) for i in reversed(range(depth))) + part
+
+
+def test_flattened_parts_are_reused():
+    left = JlString(part) + JlString(part)
+    assert left.value == part * 2
+    s = left + JlString(part)
+    assert s.value == part * 3
+    assert isinstance(left._value, str)
@@ -0,0 +1,28 @@
+import contextlib
+import io
+
+import pytest
+
+from pls_explain import engines, eval_source
+
+even_odd = """
+let odd = ();
+let even = fn(n) { if (n == 0) 1 + "x" else odd(n - 1) };
+odd = fn(n) { even(n - 1) };
+even(20000)
+"""
+
+
+def run(source, engine):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        eval_source("<test>", engines[engine](), source, debug=False)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("engine", list(engines))
+def test_mutual_tail_calls_share_a_backtrace_entry(engine):
+    output = run(even_odd, engine)
+    assert "[19997 earlier tail calls not shown]" in output
+    # the call of even, the last three tail calls and the error
+    assert output.count("<test>:") == 5
@@ -0,0 +1,294 @@
+from jltypes import *
+from environment import Environment, Cell
+from interpreter import Interpreter
+from exceptions import *
+from bytecode import *
+
+
+binary_functions = [binary_operators[op] for op in binary_ops]
+unary_functions = [unary_operators[op] for op in unary_ops]
+
+
+class VirtualMachine(Interpreter):
+    """Runs programs compiled to bytecode with a dispatch loop.
+
+    Calling a closure created by the VM doesn't recurse in python, even from
+    primitives like map and the functions made by memo. The code,
+    instruction pointer and environment of the caller are saved on a frame
+    stack and the body of the callee is run by the same loop, so the depth
+    of recursion is only limited by `max_depth` and the available memory."""
+
+    # frames are allocated on the heap, so this only guards against runaway recursion
+    default_max_depth = 100000
+    python_frames_per_call = 0
+
+    def visit(self, ast):
+        return self.run(BytecodeCompiler().compile(ast), self.environment)
+
+    def eval_with_env(self, code, env):
+        return self.run(code, env)
+
+    def resume(self, calls, value):
+        # sends value to the generator of a primitive that calls functions,
+        # see JlPrimitive. returns the next closure it calls that runs on the
+        # frame stack and the arguments, or None and the result of the
+        # primitive. other functions are called right away, like call_back
+        try:
+            while True:
+                try:
+                    f, args = calls.send(value)
+                except StopIteration as e:
+                    return None, unit if e.value is None else e.value
+                self.check_callee(f, args, None)
+                if type(f) is JlClosure and type(f.body) is Code:
+                    return f, args
+                location = self.backtrace.pop()
+                value = self.call(f, args, location)
+                self.backtrace.append(location)
+        except JlException as e:
+            if len(e.backtrace) == 0:
+                e.backtrace = self.backtrace
+            raise e
+
+    def run(self, code, env):
+        backtrace = self.backtrace
+        base = len(backtrace)
+        frames = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        instructions = code.code
+        consts = code.consts
+        names = code.names
+        checked = code.checked
+        profiler = self.profiler
+        ip = 0
+
+        while True:
+            op = instructions[ip]
+            arg = instructions[ip + 1]
+            ip += 2
+
+            if op == LOAD_LOCAL:
+                value = env.values[arg]
+                if value is None:
+                    raise UninizializedVariable(backtrace, code.local_names[ip - 2])
+                push(value)
+
+            elif op == LOAD:
+                name = names[arg]
+                frame = env
+                depth = name.binding_depth
+                while depth:
+                    frame = frame.parent
+                    depth -= 1
+                value = frame.values[name.slot]
+                if value is None:
+                    raise UninizializedVariable(backtrace, name)
+                push(value)
+
+            elif op == LOAD_CELL:
+                name = names[arg]
+                frame = env
+                depth = name.binding_depth
+                while depth:
+                    frame = frame.parent
+                    depth -= 1
+                value = frame.values[name.slot].value
+                if value is None:
+                    raise UninizializedVariable(backtrace, name)
+                push(value)
+
+            elif op == CONST:
+                push(consts[arg])
+
+            elif op == BINARY:
+                rhs = pop()
+                lhs = pop()
+                try:
+                    push(binary_functions[arg](lhs, rhs))
+                except TypeError:
+                    raise JlTypeError(f"`{binary_ops[arg]}` not possible for types {type(lhs).__name__} and {type(rhs).__name__}",
+                                      backtrace, code.location(ip - 2))
+
+            elif op == STORE_LOCAL:
+                env.values[arg] = stack[-1]
+
+            elif op == STORE:
+                name = names[arg]
+                frame = env
+                depth = name.binding_depth
+                while depth:
+                    frame = frame.parent
+                    depth -= 1
+                frame.values[name.slot] = stack[-1]
+
+            elif op == STORE_CELL:
+                name = names[arg]
+                frame = env
+                depth = name.binding_depth
+                while depth:
+                    frame = frame.parent
+                    depth -= 1
+                frame.values[name.slot].value = stack[-1]
+
+            elif op == POP:
+                pop()
+
+            elif op == JUMP_IF_FALSE:
+                if not pop().value:
+                    ip = arg
+
+            elif op == JUMP:
+                ip = arg
+
+            elif op == CALL or op == TAIL_CALL:
+                start = len(stack) - arg
+                args = stack[start:]
+                del stack[start:]
+                f = pop()
+                if type(f) is JlClosure:
+                    if f.definition is not checked[(ip - 2) >> 1]:
+                        self.check_callee(f, args, code.location(ip - 2))
+                        checked[(ip - 2) >> 1] = f.definition
+                elif type(f) is not JlPrimitive or f.arity is not None and f.arity != arg:
+                    self.check_callee(f, args, code.location(ip - 2))
+                elif not f.calls_functions and profiler is None:
+                    try:
+                        r = f.callback(*args)
+                    except JlException as e:
+                        if len(e.backtrace) == 0:
+                            e.backtrace = backtrace + [code.location(ip - 2)]
+                        raise e
+                    push(unit if r is None else r)
+                    continue
+
+                location = code.location(ip - 2)
+                calls = None
+                if type(f) is JlPrimitive and f.calls_functions:
+                    # the closures it calls run on the frame stack, see resume
+                    backtrace.append(location)
+                    if profiler is not None:
+                        profiler.enter(f, location)
+                    calls = f.callback(*args)
+                    f, args = self.resume(calls, None)
+                    if f is None:
+                        backtrace.pop()
+                        if profiler is not None:
+                            profiler.leave()
+                        push(args)
+                        continue
+                if type(f) is JlClosure and type(f.body) is Code:
+                    if calls is not None:
+                        # called from the call site of the primitive, which
+                        # is on top of the backtrace already
+                        if len(frames) + self.depth >= self.max_depth:
+                            raise RecursionDepthExceeded(backtrace, None)
+                        frames.append((code, ip, env, len(backtrace), calls))
+                    elif op == TAIL_CALL:
+                        self.push_tail_call(location)
+                        if profiler is not None:
+                            profiler.leave()
+                    else:
+                        if len(frames) + self.depth >= self.max_depth:
+                            raise RecursionDepthExceeded(backtrace, location)
+                        frames.append((code, ip, env, len(backtrace), None))
+                        backtrace.append(location)
+                    if profiler is not None:
+                        profiler.enter(f, location)
+                    env = f.frame(args)
+                    code = f.body
+                    instructions = code.code
+                    consts = code.consts
+                    names = code.names
+                    checked = code.checked
+                    ip = 0
+                else:
+                    backtrace.append(location)
+                    if profiler is not None:
+                        profiler.enter(f, location)
+                    try:
+                        r = f.call(self, args)
+                    except JlException as e:
+                        if len(e.backtrace) == 0:
+                            e.backtrace = self.backtrace
+                        raise e
+                    backtrace.pop()
+                    if profiler is not None:
+                        profiler.leave()
+                    push(unit if r is None else r)
+
+            elif op == RETURN:
+                if not frames:
+                    del backtrace[base:]
+                    return pop()
+                code, ip, env, depth, calls = frames.pop()
+                # frame is left over from the last LOAD or STORE, and it
+                # must not keep the frame that ended alive
+                frame = None
+                if profiler is not None:
+                    profiler.leave()
+                del backtrace[depth:]
+                if calls is not None:
+                    # the closure was called by a primitive, which goes on
+                    f, args = self.resume(calls, pop())
+                    if f is None:
+                        backtrace.pop()
+                        if profiler is not None:
+                            profiler.leave()
+                        push(args)
+                    else:
+                        if len(frames) + self.depth >= self.max_depth:
+                            raise RecursionDepthExceeded(backtrace, None)
+                        frames.append((code, ip, env, len(backtrace), calls))
+                        if profiler is not None:
+                            profiler.enter(f, backtrace[-1])
+                        env = f.frame(args)
+                        code = f.body
+                        ip = 0
+                instructions = code.code
+                consts = code.consts
+                names = code.names
+                checked = code.checked
+
+            elif op == ENTER:
+                env = Environment(env, arg)
+
+            elif op == CELLS:
+                for slot in consts[arg]:
+                    env.values[slot] = Cell()
+
+            elif op == LEAVE:
+                env = env.parent
+                frame = None
+
+            elif op == UNIT:
+                push(unit)
+
+            elif op == COMMENT:
+                comment = pop()
+                if not isinstance(comment, JlComment):
+                    raise JlTypeError(f"type {type(comment).__name__} can not be used to explain values",
+                                      backtrace, code.location(ip - 2))
+                push(pop().with_comment(comment))
+
+            elif op == EXPLAIN:
+                push(pop().get_comment())
+
+            elif op == CLOSURE:
+                function = consts[arg]
+                definition = function.definition
+                push(JlClosure(env.ancestor(definition.global_depth), function.params, function.code,
+                               function.frame_size, definition=definition,
+                               cells=env.capture(definition.captures)))
+
+            elif op == UNARY:
+                value = pop()
+                try:
+                    push(unary_functions[arg](value))
+                except TypeError:
+                    raise JlTypeError(f"`{unary_ops[arg]}` not possible for type {type(value).__name__}",
+                                      backtrace, code.location(ip - 2))
+
+            else:
+                assert False, f"unknown opcode {op}"